@@ -0,0 +1,122 @@
+import asyncio
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sudoku_dlx import box_shape, get_solver
+from sudoku_generator import generate_sudoku
+
+DEFAULT_BUDGET = 1000000  # rows a solve may try, far above what any valid 9x9 puzzle needs
+
+
+class BudgetExceeded(Exception):
+    """A search tried more rows than its node budget allowed."""
+
+
+def _solve(grid, box, budget, cancel):
+    """solve in a worker thread, with the thread's own solver"""
+    if cancel.is_set():
+        return None  # every request gave up while this one was queued
+    solver = get_solver(box)
+    solution = solver.solve(grid, budget=budget, cancel=cancel)
+    if solution is None and solver.aborted and not cancel.is_set():
+        raise BudgetExceeded("no solution found within %d rows" % budget)
+    return solution
+
+
+class SolverService:
+    """Solve and generate sudokus off the event loop, in a bounded thread pool.
+
+    A solve tries at most budget rows and is cancelled partway through once
+    every request waiting on it has timed out or been cancelled, so a
+    pathological puzzle holds a worker for a bounded time only. Concurrent
+    requests for the same puzzle share one in-flight computation.
+    """
+
+    def __init__(self, workers=4, budget=DEFAULT_BUDGET):
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="sudoku")
+        self.budget = budget
+        self.inflight = {}  # (cells, box, budget) -> [future, waiters, cancel event]
+
+    async def solve(self, grid, timeout=None, budget=None, box=None):
+        """solve grid, None if it has no solution
+
+        Raises asyncio.TimeoutError after timeout seconds, counting the time
+        spent queued, and BudgetExceeded if the search runs out of budget
+        rows, by default the budget of the service.
+        """
+        box = box or box_shape(len(grid))
+        budget = self.budget if budget is None else budget
+        key = (tuple(v for row in grid for v in row), box, budget)
+        entry = self.inflight.get(key)
+        if entry is None:
+            cancel = threading.Event()
+            future = asyncio.get_running_loop().run_in_executor(
+                self.executor, _solve, [row[:] for row in grid], box, budget, cancel)
+            entry = self.inflight[key] = [future, 0, cancel]
+            future.add_done_callback(lambda f: self._done(key, f))
+        future = entry[0]
+        entry[1] += 1
+        try:
+            solution = await asyncio.wait_for(asyncio.shield(future), timeout)
+        finally:
+            entry[1] -= 1
+            if not entry[1] and not future.done():
+                # nobody is waiting any more, stop the search at its next check
+                entry[2].set()
+                self._forget(key, future)
+        return None if solution is None else [row[:] for row in solution]
+
+    def _done(self, key, future):
+        if not future.cancelled():
+            future.exception()  # retrieved, even if every waiter has gone
+        self._forget(key, future)
+
+    def _forget(self, key, future):
+        entry = self.inflight.get(key)
+        if entry is not None and entry[0] is future:
+            del self.inflight[key]
+
+    async def generate(self, difficulty="medium", timeout=None, box=(3, 3), seed=None):
+        """generate a (puzzle, solution) pair, see generate_sudoku
+
+        Generating takes milliseconds, a timed out generation is abandoned
+        rather than cancelled.
+        """
+        rng = random.Random(seed) if seed is not None else None
+        future = asyncio.get_running_loop().run_in_executor(
+            self.executor, generate_sudoku, difficulty, rng, box)
+        return await asyncio.wait_for(future, timeout)
+
+    def close(self):
+        """cancel the running searches and shut the pool down"""
+        for _, _, cancel in self.inflight.values():
+            cancel.set()
+        self.executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_service = None  # shared service behind solve_async and generate_async
+
+
+def get_service():
+    """get the shared SolverService, created on first use"""
+    global _service
+    if _service is None:
+        _service = SolverService()
+    return _service
+
+
+async def solve_async(grid, timeout=None, budget=None, box=None):
+    """solve the sudoku on the shared service, see SolverService.solve"""
+    return await get_service().solve(grid, timeout, budget, box)
+
+
+async def generate_async(difficulty="medium", timeout=None, box=(3, 3), seed=None):
+    """generate a sudoku on the shared service, see SolverService.generate"""
+    return await get_service().generate(difficulty, timeout, box, seed)
@@ -0,0 +1,177 @@
+import mmap
+import os
+import random
+import struct
+
+# binary bank layout: a 16 byte header followed by fixed-size records. Each
+# record stores one byte per cell, the puzzle digit in the high nibble and the
+# solution digit in the low nibble (0 means empty / unknown).
+MAGIC = b"SDKBANK\x01"
+HEADER = struct.Struct("<8sI4x")  # magic, record size
+RECORD_SIZE = 81
+
+
+def grid_to_line(grid):
+    """convert a grid to the 81-character line format, '.' for empty cells"""
+    return "".join(str(v) if v else "." for row in grid for v in row)
+
+
+def line_to_grid(line):
+    """convert an 81-character line to a grid, '.' and '0' are empty cells"""
+    cells = [0 if ch in ".0" else int(ch) for ch in line.strip()]
+    if len(cells) != 81:
+        raise ValueError("expected 81 cells, got %d" % len(cells))
+    return [cells[i:i + 9] for i in range(0, 81, 9)]
+
+
+def write_text(f, records):
+    """write (puzzle, solution) pairs to a text file, one per line
+
+    A line is the puzzle in 81-character format, followed by a comma and the
+    solution when it is not None. Records are written as they are produced.
+    Returns the number of records written.
+    """
+    count = 0
+    for puzzle, solution in records:
+        if solution is None:
+            f.write(grid_to_line(puzzle) + "\n")
+        else:
+            f.write(grid_to_line(puzzle) + "," + grid_to_line(solution) + "\n")
+        count += 1
+    return count
+
+
+def read_text(f):
+    """read (puzzle, solution) pairs from lines written by write_text
+
+    solution is None for lines holding only a puzzle, blank lines and lines
+    starting with '#' are skipped.
+    """
+    for line in f:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        puzzle, _, solution = line.partition(",")
+        yield line_to_grid(puzzle), line_to_grid(solution) if solution else None
+
+
+def pack_record(puzzle, solution=None):
+    """pack a puzzle and its solution into one binary record"""
+    if solution is None:
+        return bytes(v << 4 for row in puzzle for v in row)
+    return bytes(p << 4 | s for prow, srow in zip(puzzle, solution) for p, s in zip(prow, srow))
+
+
+def unpack_record(data):
+    """unpack a binary record into (puzzle, solution), solution is None if unknown"""
+    puzzle = [[b >> 4 for b in data[i:i + 9]] for i in range(0, 81, 9)]
+    if not any(b & 0xF for b in data):
+        return puzzle, None
+    solution = [[b & 0xF for b in data[i:i + 9]] for i in range(0, 81, 9)]
+    return puzzle, solution
+
+
+class BankWriter:
+    """Append records to a binary puzzle bank, creating it if needed."""
+
+    def __init__(self, path):
+        self.path = path
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            with open(path, "rb") as f:
+                _check_header(f.read(HEADER.size))
+        self.file = open(path, "ab")
+        if not exists:
+            self.file.write(HEADER.pack(MAGIC, RECORD_SIZE))
+        self.count = 0  # records appended by this writer
+
+    def append(self, puzzle, solution=None):
+        """append one record"""
+        self.file.write(pack_record(puzzle, solution))
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_bank(path, records):
+    """append every (puzzle, solution) pair of records to a binary bank
+
+    records may be a generator, each record is written as soon as it is
+    produced. Returns the number of records written.
+    """
+    with BankWriter(path) as writer:
+        for puzzle, solution in records:
+            writer.append(puzzle, solution)
+        return writer.count
+
+
+class PuzzleBank:
+    """Read-only view of a binary puzzle bank through a memory-mapped file.
+
+    Records are decoded on access, so indexing is O(1) and the bank is never
+    loaded into memory as a whole.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        try:
+            # checked before mapping, mmap cannot map an empty file
+            self.record_size = _check_header(self.file.read(HEADER.size))
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self.file.close()
+            raise
+        self.count = (len(self.map) - HEADER.size) // self.record_size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        """get (puzzle, solution) of the record at index"""
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("bank index out of range")
+        start = HEADER.size + index * self.record_size
+        return unpack_record(self.map[start:start + self.record_size])
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+    def random(self, rng=None):
+        """get a uniformly random record"""
+        if not self.count:
+            raise IndexError("random record of an empty bank")
+        if rng is None:
+            rng = random
+        return self[rng.randrange(self.count)]
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _check_header(data):
+    """validate a bank header and return its record size"""
+    if len(data) < HEADER.size:
+        raise ValueError("not a puzzle bank: truncated header")
+    magic, record_size = HEADER.unpack(data[:HEADER.size])
+    if magic != MAGIC:
+        raise ValueError("not a puzzle bank: bad magic %r" % magic)
+    if record_size != RECORD_SIZE:
+        raise ValueError("unsupported record size %d" % record_size)
+    return record_size
@@ -0,0 +1,253 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from sudoku_bank import read_text
+from sudoku_engines import ENGINES, PROCESS_ENGINES, SELECTORS, AutoPolicy, features
+
+CORPORA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpora")
+CORPORA = ("easy", "hard", "hardest")
+IMPORTS = ("sudoku_dlx", "sudoku_solver", "sudoku_generator")  # modules timed by import_time
+
+
+def load_corpus(name):
+    """load the puzzles of a bundled corpus, or of a puzzle file given by path"""
+    path = name if os.path.exists(name) else os.path.join(CORPORA_DIR, name + ".txt")
+    with open(path) as f:
+        return [puzzle for puzzle, _ in read_text(f)]
+
+
+def corpus_features(corpus, puzzles):
+    """the mean clues and singles of a corpus, see sudoku_engines.features"""
+    found = [features(puzzle) for puzzle in puzzles]
+    return {
+        "corpus": corpus,
+        "puzzles": len(puzzles),
+        "clues": sum(clues for clues, _ in found) / len(found) if found else None,
+        "singles": sum(singles for _, singles in found) / len(found) if found else None,
+    }
+
+
+def percentile(values, p):
+    """nearest-rank percentile of sorted values"""
+    if not values:
+        return None
+    k = max(0, min(len(values) - 1, -(-len(values) * p // 100) - 1))
+    return values[int(k)]
+
+
+def _time_engine(engine, puzzles):
+    """solve every puzzle, return the per-puzzle latencies and the solved count"""
+    solve = ENGINES[engine]()
+    latencies = []
+    solved = 0
+    for puzzle in puzzles:
+        start = time.perf_counter()
+        result = solve(puzzle)
+        latencies.append(time.perf_counter() - start)
+        solved += result is not None
+    return latencies, solved
+
+
+def _trace_engine(engine, puzzles):
+    """solve every puzzle under tracemalloc, return the peak traced memory"""
+    solve = ENGINES[engine]()
+    tracemalloc.start()
+    try:
+        for puzzle in puzzles:
+            solve(puzzle)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def import_time(module, runs=5):
+    """best cumulative import time of module in a fresh interpreter, in seconds
+
+    Measured with -X importtime, so interpreter startup is left out.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                              cwd=here, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+        for line in proc.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            fields = line.split("|")
+            if len(fields) == 3 and fields[2].strip() == module:
+                cumulative = int(fields[1]) / 1e6
+                best = cumulative if best is None else min(best, cumulative)
+    return best
+
+
+def _run_isolated(func, args, timeout):
+    """run func(*args) in a fresh process, None if it exceeds timeout seconds"""
+    with multiprocessing.Pool(1) as pool:
+        try:
+            return pool.apply_async(func, args).get(timeout)
+        except multiprocessing.TimeoutError:
+            return None
+
+
+def bench_engine(engine, corpus, puzzles, timeout=60.0, memory=True):
+    """benchmark one engine on one corpus
+
+    Timing and memory are measured in separate child processes, so tracemalloc
+    does not skew latencies and a pathological engine/corpus pair is abandoned
+    after timeout seconds instead of stalling the run.
+    """
+    result = {"engine": engine, "corpus": corpus, "puzzles": len(puzzles)}
+    timed = _run_isolated(_time_engine, (engine, puzzles), timeout)
+    if timed is None:
+        result["status"] = "timeout"
+        return result
+    latencies, solved = timed
+    total = sum(latencies)
+    latencies.sort()
+    result.update({
+        "status": "ok",
+        "solved": solved,
+        "total": total,
+        "mean": total / len(latencies) if latencies else None,
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "max": latencies[-1] if latencies else None,
+        "puzzles_per_sec": len(latencies) / total if total else None,
+    })
+    if memory:
+        result["peak_memory"] = _run_isolated(_trace_engine, (engine, puzzles), timeout)
+    return result
+
+
+def run(engines=None, corpora=CORPORA, timeout=60.0, memory=True, progress=None, imports=IMPORTS):
+    """benchmark every engine on every corpus and the import time of every module in imports
+
+    Returns a JSON-serializable report. It also holds the mean features of
+    every corpus, so sudoku_engines.AutoPolicy.from_report can tune the
+    "auto" engine from it. engines defaults to every engine but "auto" and
+    "race"; race starts processes of its own, so it cannot be benchmarked in
+    the pool workers that time the engines.
+    """
+    engines = list(engines or (engine for engine in ENGINES if engine not in SELECTORS))
+    for engine in engines:
+        if engine in PROCESS_ENGINES:
+            raise ValueError("the %s engine starts processes of its own and cannot be benchmarked" % engine)
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "timeout": timeout,
+        },
+        "results": [],
+        "corpora": [],
+        "imports": [{"module": module, "import_time": import_time(module)} for module in imports],
+    }
+    for corpus in corpora:
+        puzzles = load_corpus(corpus)
+        report["corpora"].append(corpus_features(corpus, puzzles))
+        for engine in engines:
+            result = bench_engine(engine, corpus, puzzles, timeout, memory)
+            report["results"].append(result)
+            if progress:
+                progress(result)
+    return report
+
+
+def compare(baseline, report, threshold=0.10):
+    """list the results whose mean latency regressed by more than threshold"""
+    old = {(r["engine"], r["corpus"]): r for r in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        before = old.get((result["engine"], result["corpus"]))
+        if before is None or before.get("status") != "ok":
+            continue
+        if result.get("status") != "ok":
+            regressions.append((result, before, None))
+            continue
+        ratio = result["mean"] / before["mean"] if before["mean"] else 1.0
+        if ratio > 1.0 + threshold:
+            regressions.append((result, before, ratio))
+    return regressions
+
+
+def compare_imports(baseline, report, threshold=0.10, floor=0.001):
+    """list the (module, before, after) import times that grew by more than threshold
+
+    Growth below floor seconds is ignored as noise.
+    """
+    old = {r["module"]: r["import_time"] for r in baseline.get("imports", ())}
+    regressions = []
+    for result in report.get("imports", ()):
+        before, after = old.get(result["module"]), result["import_time"]
+        if before and after > before * (1.0 + threshold) and after - before > floor:
+            regressions.append((result["module"], before, after))
+    return regressions
+
+
+def format_result(result):
+    """one human-readable line for a benchmark result"""
+    name = "%-24s %-8s" % (result["engine"], result["corpus"])
+    if result["status"] != "ok":
+        return "%s %s" % (name, result["status"])
+    line = "%s mean %8.2fms  p50 %8.2fms  p99 %8.2fms  max %8.2fms  %9.1f/s" % (
+        name, result["mean"] * 1e3, result["p50"] * 1e3, result["p99"] * 1e3,
+        result["max"] * 1e3, result["puzzles_per_sec"])
+    if result.get("peak_memory") is not None:
+        line += "  peak %7.1fKiB" % (result["peak_memory"] / 1024)
+    return line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="benchmark the sudoku solver engines")
+    parser.add_argument("--engines", nargs="+", choices=sorted(set(ENGINES) - set(PROCESS_ENGINES)),
+                        help="engines to run (default: all but auto and race)")
+    parser.add_argument("--corpora", nargs="+", default=list(CORPORA), help="bundled corpus names or puzzle files")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds allowed per engine and corpus")
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory pass")
+    parser.add_argument("--imports", nargs="*", default=list(IMPORTS), help="modules to time the import of (default: %(default)s)")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report to compare against, exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed mean latency growth against the baseline")
+    args = parser.parse_args(argv)
+
+    report = run(args.engines, args.corpora, args.timeout, not args.no_memory,
+                 progress=lambda result: print(format_result(result), file=sys.stderr),
+                 imports=args.imports)
+    for result in report["imports"]:
+        print("import %-24s %8.2fms" % (result["module"], result["import_time"] * 1e3), file=sys.stderr)
+    try:
+        print("auto policy for these results: %r" % AutoPolicy.from_report(report), file=sys.stderr)
+    except ValueError:
+        pass  # no engine finished any corpus
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold)
+        for result, before, ratio in regressions:
+            change = "now %s" % result["status"] if ratio is None else "%+.0f%% mean" % ((ratio - 1) * 100)
+            print("regression: %s on %s, %s" % (result["engine"], result["corpus"], change), file=sys.stderr)
+        slow_imports = compare_imports(baseline, report, args.threshold)
+        for module, before, after in slow_imports:
+            print("regression: import %s, %.2fms -> %.2fms" % (module, before * 1e3, after * 1e3), file=sys.stderr)
+        if regressions or slow_imports:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
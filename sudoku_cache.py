@@ -0,0 +1,262 @@
+import itertools
+import math
+from collections import OrderedDict
+from operator import itemgetter
+
+from sudoku_dlx import solve_sudoku
+from sudoku_solver import Solver
+
+BANDS = ((0, 1, 2), (3, 4, 5), (6, 7, 8))
+MAX_ARRANGEMENTS = 24  # tied orders canonical_form tries before giving up on a grid
+
+
+class Transform:
+    """A validity-preserving sudoku transform.
+
+    The transformed grid has, at (i, j), the digit digits[v] where v is the
+    cell (rows[i], cols[j]) of the grid, transposed first if transpose is set.
+    digits maps every digit 0-9 and always keeps 0 as 0.
+    """
+
+    __slots__ = ("transpose", "rows", "cols", "digits")
+
+    def __init__(self, transpose, rows, cols, digits):
+        self.transpose = transpose
+        self.rows = tuple(rows)
+        self.cols = tuple(cols)
+        self.digits = tuple(digits)
+
+    def apply(self, grid):
+        """map a grid to the transformed space"""
+        if self.transpose:
+            grid = [list(col) for col in zip(*grid)]
+        digits = self.digits
+        return [[digits[grid[r][c]] for c in self.cols] for r in self.rows]
+
+    def invert(self, grid):
+        """map a grid from the transformed space back"""
+        inverse = [0] * 10
+        for v, d in enumerate(self.digits):
+            inverse[d] = v
+        result = [[0] * 9 for _ in range(9)]
+        for i, r in enumerate(self.rows):
+            for j, c in enumerate(self.cols):
+                result[r][c] = inverse[grid[i][j]]
+        if self.transpose:
+            result = [list(col) for col in zip(*result)]
+        return result
+
+    def __repr__(self):
+        return "Transform(transpose=%r, rows=%r, cols=%r, digits=%r)" % (
+            self.transpose, self.rows, self.cols, self.digits)
+
+
+def _line_keys(grid):
+    """invariant keys of the rows and of the columns of a grid
+
+    A key only depends on what no transform changes: clue counts, per stack
+    (or band) and per crossing line, and how often the digit of each clue
+    appears in the whole grid. One refinement round adds the keys of the
+    crossing lines holding a clue, which tells most look-alike lines apart.
+    """
+    freq = [0] * 10
+    for row in grid:
+        for v in row:
+            freq[v] += 1
+    cols = [tuple(col) for col in zip(*grid)]
+
+    def first_round(lines, crossing):
+        counts = [9 - line.count(0) for line in crossing]
+        return [(9 - line.count(0),
+                 tuple(sorted(sum(1 for i in stack if line[i]) for stack in BANDS)),
+                 tuple(sorted((counts[i], freq[v]) for i, v in enumerate(line) if v)))
+                for line in lines]
+
+    rows1 = first_round(grid, cols)
+    cols1 = first_round(cols, grid)
+    rows2 = [(rows1[r], tuple(sorted(cols1[c] for c in range(9) if grid[r][c]))) for r in range(9)]
+    cols2 = [(cols1[c], tuple(sorted(rows1[r] for r in range(9) if grid[r][c]))) for c in range(9)]
+    return rows2, cols2
+
+
+def _tied_groups(items, keys):
+    """items sorted by key, as lists of items with equal keys"""
+    items = sorted(items, key=keys.__getitem__)
+    return [list(group) for _, group in itertools.groupby(items, key=keys.__getitem__)]
+
+
+def _count_orders(groups):
+    count = 1
+    for group in groups:
+        count *= math.factorial(len(group))
+    return count
+
+
+def _orders(groups):
+    """every order keeping the groups in sequence, each group in every order"""
+    return [sum(parts, ()) for parts in itertools.product(*(itertools.permutations(g) for g in groups))]
+
+
+def _line_orders(keys):
+    """(count, orders) of the 9 lines sorted by band key, then by key within bands
+
+    Lines and bands with equal keys can come in any order among themselves,
+    orders is a function building every resulting order, count their number.
+    """
+    band_keys = [tuple(sorted(keys[i] for i in band)) for band in BANDS]
+    band_groups = _tied_groups(range(3), band_keys)
+    within = [_tied_groups(band, keys) for band in BANDS]
+    count = _count_orders(band_groups)
+    for groups in within:
+        count *= _count_orders(groups)
+
+    def orders():
+        inner = [_orders(groups) for groups in within]
+        return [sum(parts, ()) for bands in _orders(band_groups)
+                for parts in itertools.product(*(inner[b] for b in bands))]
+
+    return count, orders
+
+
+def canonical_form(grid):
+    """map a 9x9 grid to a canonical string and the transform reaching it
+
+    Bands, rows within bands, stacks and columns within stacks, and the
+    orientation, are ordered by invariant keys (see _line_keys); only lines
+    whose keys tie are tried in every order, and the smallest 81-character
+    string, '0' for empty cells and digits relabeled in order of appearance,
+    wins. Two grids that transform into each other get the same string, and
+    grids that don't get different ones. Returns (string, Transform) with
+    Transform.apply(grid) giving the canonical grid, or (None, None) for
+    grids with more than MAX_ARRANGEMENTS tied orders, such as very sparse
+    ones, which would cost more to canonicalize than to solve.
+    """
+    grid = [tuple(row) for row in grid]
+    row_keys, col_keys = _line_keys(grid)
+    orientations = []
+    for transpose in (False, True):
+        src = [tuple(col) for col in zip(*grid)] if transpose else grid
+        rows, cols = (col_keys, row_keys) if transpose else (row_keys, col_keys)
+        shape = (sorted(tuple(sorted(rows[i] for i in band)) for band in BANDS),
+                 sorted(tuple(sorted(cols[i] for i in band)) for band in BANDS))
+        orientations.append((shape, transpose, src, rows, cols))
+    # transposing swaps the band and stack shapes, keep the smaller one, or both if equal
+    least = min(shape for shape, *_ in orientations)
+    orientations = [o[1:] for o in orientations if o[0] == least]
+
+    plans = []
+    total = 0
+    for transpose, src, rows, cols in orientations:
+        row_count, row_orders = _line_orders(rows)
+        col_count, col_orders = _line_orders(cols)
+        total += row_count * col_count
+        plans.append((transpose, src, row_orders, col_orders))
+    if total > MAX_ARRANGEMENTS:
+        return None, None
+
+    best = best_transform = None
+    for transpose, src, row_orders, col_orders in plans:
+        col_orders = col_orders()
+        for row_order in row_orders():
+            for col_order in col_orders:
+                get = itemgetter(*col_order)
+                mapping = [0] * 10
+                label = 1
+                cells = []
+                for r in row_order:
+                    for v in get(src[r]):
+                        if v and not mapping[v]:
+                            mapping[v] = label
+                            label += 1
+                        cells.append(mapping[v])
+                if best is None or cells < best:
+                    best = cells
+                    best_transform = (transpose, row_order, col_order, mapping)
+
+    transpose, row_order, col_order, mapping = best_transform
+    # unseen digits take the remaining labels in order
+    free = iter(d for d in range(1, 10) if d not in mapping)
+    for v in range(1, 10):
+        if not mapping[v]:
+            mapping[v] = next(free)
+    return "".join(map(str, best)), Transform(transpose, row_order, col_order, mapping)
+
+
+_MISSING = object()
+
+
+class SolutionCache:
+    """LRU cache of solutions keyed by canonical puzzle form.
+
+    Puzzles that are transforms of each other share an entry, a hit maps the
+    cached canonical solution back through the inverse transform. Exact
+    repeats are answered from a second LRU keyed by the puzzle itself, without
+    canonicalizing. Unsolvable puzzles are cached as None. Grids too
+    symmetric for canonical_form only get exact repeats cached, grids other
+    than 9x9 are passed through.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()  # canonical string -> canonical solution
+        self.recent = OrderedDict()  # puzzle string -> solution
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def solve(self, grid, solve=solve_sudoku):
+        """the solution of grid from the cache, or from solve on a miss"""
+        if len(grid) != 9:
+            return solve(grid)
+        raw = "".join(str(v) for row in grid for v in row)
+        solution = self.recent.get(raw, _MISSING)
+        if solution is not _MISSING:
+            self.hits += 1
+            self.recent.move_to_end(raw)
+            return None if solution is None else [row[:] for row in solution]
+
+        key, transform = canonical_form(grid)
+        canonical = _MISSING if key is None else self.entries.get(key, _MISSING)
+        if canonical is not _MISSING:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            solution = None if canonical is None else transform.invert(canonical)
+        else:
+            self.misses += 1
+            solution = solve(grid)
+            if key is not None:
+                self._store(self.entries, key, None if solution is None else transform.apply(solution))
+        self._store(self.recent, raw, None if solution is None else [row[:] for row in solution])
+        return solution
+
+    def _store(self, entries, key, value):
+        entries[key] = value
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.recent.clear()
+        self.hits = self.misses = 0
+
+
+class CachedSolver(Solver):
+    """Put a SolutionCache in front of another Solver."""
+
+    def __init__(self, solver, cache=None):
+        super().__init__()
+        self.solver = solver
+        self.cache = cache if cache is not None else SolutionCache()
+
+    def solve(self, puzzle, stats=None):
+        return self.cache.solve(puzzle, lambda grid: self.solver.solve(grid, stats))
+
+
+_cache = SolutionCache()  # shared cache behind solve_sudoku_cached
+
+
+def solve_sudoku_cached(grid):
+    """solve_sudoku through the shared solution cache"""
+    return _cache.solve(grid)
@@ -0,0 +1,197 @@
+import argparse
+import collections
+import os
+import sys
+
+from sudoku_dlx import box_shape
+from sudoku_engines import ENGINES, PROCESS_ENGINES, AutoPolicy, get_engine, set_policy, supports
+from sudoku_grid import Grid
+
+CHUNK_LINES = 1000  # lines read, solved and written as one batch
+BUFFER_SIZE = 1 << 20  # bytes buffered per input and output file
+
+def solve_lines(lines, engine="auto", first=1):
+    """solve puzzles given in the line format, returning (output, errors)
+
+    Each line holds a puzzle, optionally followed by a comma and anything
+    else, which is ignored; blank lines and lines starting with '#' are
+    skipped. output has a "puzzle,solution" line per puzzle, just the puzzle
+    when it has no solution, so it reads back with sudoku_bank.read_text.
+    errors lists (line number, message) for the lines that are not puzzles,
+    counting lines from first.
+    """
+    solve = get_engine(engine)
+    out = []
+    errors = []
+    for lineno, line in enumerate(lines, first):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            grid = Grid.from_string(line.partition(",")[0])
+        except ValueError as e:
+            errors.append((lineno, str(e)))
+            continue
+        if not grid.size or box_shape(grid.size)[0] == 1:
+            # 1x1, 2x2, 3x3 or any prime size: no boxes, so not a sudoku
+            errors.append((lineno, "not a sudoku, %dx%d grids have no boxes" % (grid.size, grid.size)))
+            continue
+        if max(grid.cells) > grid.size:
+            errors.append((lineno, "not a %dx%d sudoku" % (grid.size, grid.size)))
+            continue
+        if not supports(engine, grid.size):
+            errors.append((lineno, "the %s engine does not solve %dx%d puzzles" % (engine, grid.size, grid.size)))
+            continue
+        solution = solve(grid)
+        if solution is None:
+            out.append(grid.to_string() + "\n")
+        else:
+            out.append(grid.to_string() + "," + Grid.from_rows(solution).to_string() + "\n")
+    return "".join(out), errors
+
+
+def _solve_task(task):
+    path, engine, first, lines = task
+    output, errors = solve_lines(lines, engine, first)
+    return path, output, errors
+
+
+def _load_policy(path):
+    """set the "auto" engine's policy from a sudoku_bench report, in every process"""
+    import json
+    with open(path) as f:
+        set_policy(AutoPolicy.from_report(json.load(f)))
+
+
+def _tasks(paths, engine):
+    """split the input files into chunks of lines, "-" reads stdin"""
+    for path in paths:
+        f = sys.stdin if path == "-" else open(path, buffering=BUFFER_SIZE)
+        try:
+            first = 1
+            while True:
+                lines = f.readlines(CHUNK_LINES * 100)  # about CHUNK_LINES 81-char lines
+                if not lines:
+                    break
+                yield path, engine, first, lines
+                first += len(lines)
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+
+def _write_solved(out, result):
+    path, output, errors = result
+    out.write(output)
+    for lineno, message in errors:
+        print("%s:%d: %s" % ("<stdin>" if path == "-" else path, lineno, message), file=sys.stderr)
+    return len(errors)
+
+
+def solve_command(args, out):
+    if args.policy:
+        _load_policy(args.policy)
+    tasks = _tasks(args.files or ["-"], args.engine)
+    failed = 0
+    if args.jobs == 1:
+        for task in tasks:
+            failed += _write_solved(out, _solve_task(task))
+    else:
+        import multiprocessing
+        initargs = (args.policy,) if args.policy else ()
+        with multiprocessing.Pool(args.jobs or None, _load_policy if args.policy else None, initargs) as pool:
+            # a bounded window of chunks in flight, written back in input order
+            window = 2 * (args.jobs or multiprocessing.cpu_count())
+            pending = collections.deque()
+            for task in tasks:
+                pending.append(pool.apply_async(_solve_task, (task,)))
+                if len(pending) >= window:
+                    failed += _write_solved(out, pending.popleft().get())
+            while pending:
+                failed += _write_solved(out, pending.popleft().get())
+    return 1 if failed else 0
+
+
+def generate_command(args, out):
+    from sudoku_generator import generate_batch
+    records = generate_batch(args.count, args.difficulty, args.jobs or None, args.seed,
+                             box=args.box, unbiased=args.unbiased, minimal=args.minimal,
+                             symmetric=not args.asymmetric)
+    lines = []
+    for puzzle, solution in records:
+        line = Grid.from_rows(puzzle).to_string()
+        if args.solutions:
+            line += "," + Grid.from_rows(solution).to_string()
+        lines.append(line + "\n")
+        if len(lines) >= CHUNK_LINES:
+            out.write("".join(lines))
+            del lines[:]
+    out.write("".join(lines))
+    return 0
+
+
+def _box(text):
+    """parse a box shape given as ROWSxCOLS"""
+    try:
+        rows, cols = map(int, text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected ROWSxCOLS, e.g. 3x3, got %r" % text)
+    return rows, cols
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="sudoku", description="solve, generate and benchmark sudokus in bulk")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    solve = commands.add_parser("solve", help="solve puzzles read one per line, 81-character format")
+    solve.add_argument("files", nargs="*", help="puzzle files, stdin when none or '-'")
+    solve.add_argument("--engine", choices=sorted(ENGINES), default="auto",
+                       help="solver engine, auto picks one per puzzle and race runs two at once (default: %(default)s)")
+    solve.add_argument("--policy", metavar="REPORT", help="tune the auto engine from a sudoku_bench JSON report")
+
+    generate = commands.add_parser("generate", help="generate puzzles, one per line")
+    generate.add_argument("count", type=int, help="number of puzzles")
+    generate.add_argument("--difficulty", choices=("easy", "medium", "hard"), default="medium")
+    generate.add_argument("--seed", type=int, help="seed, the same seed gives the same set of puzzles")
+    generate.add_argument("--box", type=_box, default=(3, 3), help="box shape as ROWSxCOLS (default: 3x3)")
+    generate.add_argument("--solutions", action="store_true", help="append ',solution' to every puzzle")
+    generate.add_argument("--minimal", action="store_true", help="remove clues until none can go")
+    generate.add_argument("--asymmetric", action="store_true", help="remove clues one at a time, not in symmetric pairs")
+    generate.add_argument("--unbiased", action="store_true", help="draw every solution grid by search")
+
+    for command in (solve, generate):
+        command.add_argument("--jobs", "-j", type=int, default=1, help="worker processes, 0 for one per CPU (default: 1)")
+        command.add_argument("--output", "-o", help="output file (default: stdout)")
+
+    # listed for the help only, the arguments are sudoku_bench's and passed on as is
+    commands.add_parser("bench", help="time the solver engines, see sudoku_bench.py --help")
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["bench"]:
+        import sudoku_bench
+        return sudoku_bench.main(argv[1:])
+
+    args = parser.parse_args(argv)
+    if args.command == "solve" and args.engine in PROCESS_ENGINES and args.jobs != 1:
+        # pool workers are daemonic and may not start the engine's processes
+        parser.error("the %s engine starts processes of its own, use it with --jobs 1" % args.engine)
+
+    out = sys.stdout if args.output is None else open(args.output, "w", buffering=BUFFER_SIZE)
+    try:
+        if args.command == "solve":
+            return solve_command(args, out)
+        return generate_command(args, out)
+    except BrokenPipeError:
+        # the reader went away, e.g. piped into head; point stdout at devnull so
+        # flushing it on exit doesn't fail again
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    except OSError as e:
+        print("sudoku: %s" % e, file=sys.stderr)
+        return 1
+    finally:
+        if args.output is not None:
+            out.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,37 +1,58 @@
+import time
+
+try:
+    # CPython's threading.local is this class; taking it from _thread skips
+    # importing threading, which would be most of this module's import time
+    from _thread import _local as thread_local
+except ImportError:
+    from threading import local as thread_local
+
+CHECK_EVERY = 1024  # rows tried between checks of a search's cancel event
+
+
 class DLX:
     def __init__(self):
-        self.MAXSIZE = 100010
         self.n = 0  # number of rows
         self.m = 0  # number of columns
         self.tot = 0  # number of nodes
-        self.first = [0] * (self.MAXSIZE + 10)  # the first node in each row
-        self.siz = [0] * (self.MAXSIZE + 10)  # the number of nodes in each column
-        self.L = [0] * (self.MAXSIZE + 10)  # left pointer
-        self.R = [0] * (self.MAXSIZE + 10)  # right pointer
-        self.U = [0] * (self.MAXSIZE + 10)  # up pointer
-        self.D = [0] * (self.MAXSIZE + 10)  # down pointer
-        self.col = [0] * (self.MAXSIZE + 10)  # the column of the node
-        self.row = [0] * (self.MAXSIZE + 10)  # the row of the node
+        self.first = [0]  # the first node in each row
+        self.siz = [0]  # the number of nodes in each column
+        self.L = [0]  # left pointer
+        self.R = [0]  # right pointer
+        self.U = [0]  # up pointer
+        self.D = [0]  # down pointer
+        self.col = [0]  # the column of the node
+        self.row = [0]  # the row of the node
+        self.nodes = 0  # rows tried by the last search
+        self.backtracks = 0  # dead ends hit by the last search
+        self.aborted = False  # whether the last search ran out of budget or was cancelled
+        self.size = 9  # grid size used to decode the rows of a solution in dance
 
     def build(self, r, c):
-        """initialize DLX"""
+        """initialize DLX, node arrays grow as nodes are inserted"""
         self.n = r
         self.m = c
-        for i in range(c + 1):
-            self.L[i] = i - 1
-            self.R[i] = i + 1
-            self.U[i] = self.D[i] = i
+        self.L = list(range(-1, c))
+        self.R = list(range(1, c + 2))
+        self.U = list(range(c + 1))
+        self.D = list(range(c + 1))
         self.L[0] = c
         self.R[c] = 0
+        self.col = list(range(c + 1))
+        self.row = [0] * (c + 1)
         self.tot = c
-        self.first = [0] * (self.MAXSIZE + 10)
-        self.siz = [0] * (self.MAXSIZE + 10)
+        self.first = [0] * (r + 1)
+        self.siz = [0] * (c + 1)
 
     def insert(self, r, c):
         """insert a node"""
         self.tot += 1
-        self.col[self.tot] = c
-        self.row[self.tot] = r
+        self.L.append(0)
+        self.R.append(0)
+        self.U.append(0)
+        self.D.append(0)
+        self.col.append(c)
+        self.row.append(r)
         self.siz[c] += 1
         
         self.D[self.tot] = self.D[c]
@@ -73,59 +94,389 @@ class DLX:
             i = self.U[i]
         self.L[self.R[c]] = self.R[self.L[c]] = c
 
-    def dance(self, dep, stk, ans):
-        """Dancing Links algorithm main process"""
-        if not self.R[0]:
-            for i in range(1, dep):
-                x = (stk[i] - 1) // 9 // 9
-                y = (stk[i] - 1) // 9 % 9
-                v = (stk[i] - 1) % 9 + 1
-                ans[x][y] = v
-            return True
-
-        c = self.R[0]
-        i = self.R[0]
-        while i != 0:
-            if self.siz[i] < self.siz[c]:
-                c = i
-            i = self.R[i]
-
-        self.remove(c)
-        i = self.D[c]
-        while i != c:
-            stk[dep] = self.row[i]
-            j = self.R[i]
-            while j != i:
-                self.remove(self.col[j])
-                j = self.R[j]
-            if self.dance(dep + 1, stk, ans):
-                return True
-            j = self.L[i]
-            while j != i:
-                self.recover(self.col[j])
-                j = self.L[j]
-            i = self.D[i]
-        self.recover(c)
-        return False
+    def copy_from(self, other):
+        """take a private copy of the matrix of another DLX"""
+        self.n, self.m, self.tot = other.n, other.m, other.tot
+        self.first = other.first[:]
+        self.siz = other.siz[:]
+        self.L = other.L[:]
+        self.R = other.R[:]
+        self.U = other.U[:]
+        self.D = other.D[:]
+        self.col = other.col[:]
+        self.row = other.row[:]
+
+    def hide(self, r):
+        """unlink row r from its columns, so no solution can use it"""
+        i = j = self.first[r]
+        while True:
+            self.U[self.D[j]] = self.U[j]
+            self.D[self.U[j]] = self.D[j]
+            self.siz[self.col[j]] -= 1
+            j = self.R[j]
+            if j == i:
+                break
+
+    def unhide(self, r):
+        """relink row r after hide"""
+        i = j = self.first[r]
+        while True:
+            j = self.L[j]
+            self.U[self.D[j]] = self.D[self.U[j]] = j
+            self.siz[self.col[j]] += 1
+            if j == i:
+                break
+
+    def search(self, stats=None, rng=None, budget=None, cancel=None):
+        """iterative Algorithm X over an explicit stack
+
+        A generator yielding the stack of chosen nodes for each solution. The
+        stack is reused, so read it before resuming. The search is suspended
+        between solutions and can be resumed or closed at any point, the matrix
+        is restored when it finishes or is closed. stats is an optional
+        SolverStats to record nodes, depths and backtracks in.
+
+        rng is an optional random.Random, the rows of every chosen column are
+        then tried in a random order drawn from it. The search gives up once it
+        has tried budget rows, or soon after the optional threading.Event
+        cancel is set, setting self.aborted.
+        """
+        L, R, U, D, col, siz = self.L, self.R, self.U, self.D, self.col, self.siz
+
+        def remove(c):
+            L[R[c]] = L[c]
+            R[L[c]] = R[c]
+            i = D[c]
+            while i != c:
+                j = R[i]
+                while j != i:
+                    U[D[j]] = U[j]
+                    D[U[j]] = D[j]
+                    siz[col[j]] -= 1
+                    j = R[j]
+                i = D[i]
+
+        def recover(c):
+            i = U[c]
+            while i != c:
+                j = L[i]
+                while j != i:
+                    U[D[j]] = D[U[j]] = j
+                    siz[col[j]] += 1
+                    j = L[j]
+                i = U[i]
+            L[R[c]] = R[L[c]] = c
+
+        def choose():
+            c = i = R[0]
+            s = siz[c]
+            while i != 0:
+                if siz[i] < s:
+                    c = i
+                    s = siz[i]
+                    if s < 2:
+                        break
+                i = R[i]
+            return c
+
+        def shuffled(c):
+            rows = []
+            i = D[c]
+            while i != c:
+                rows.append(i)
+                i = D[i]
+            rng.shuffle(rows)
+            rows.append(c)  # popped last, marks the column as exhausted
+            rows.reverse()
+            return rows
+
+        stk = []  # the chosen node of each level
+        orders = []  # the rows left to try at each level, when shuffling
+        self.nodes = self.backtracks = 0
+        self.aborted = False
+        if not R[0]:
+            yield stk
+            return
+        nodes = backtracks = 0
+        c = choose()
+        remove(c)
+        if rng is None:
+            i = D[c]
+        else:
+            orders.append(shuffled(c))
+            i = orders[-1].pop()
+        # the next node count to check budget and cancel at
+        checkpoint = budget if cancel is None else 0
+        suspended = False
+        try:
+            while True:
+                if i == c:
+                    # column exhausted, backtrack to the previous level
+                    recover(c)
+                    if not stk:
+                        return
+                    i = stk.pop()
+                    j = L[i]
+                    while j != i:
+                        recover(col[j])
+                        j = L[j]
+                    c = col[i]
+                    if rng is None:
+                        i = D[i]
+                    else:
+                        orders.pop()
+                        i = orders[-1].pop()
+                    continue
+
+                if nodes == checkpoint:
+                    if nodes == budget or cancel.is_set():
+                        # out of budget or cancelled, unwind like a search closed at a solution
+                        recover(c)
+                        self.aborted = suspended = True
+                        return
+                    checkpoint = nodes + CHECK_EVERY
+                    if budget is not None and budget < checkpoint:
+                        checkpoint = budget
+                nodes += 1
+                if stats is not None:
+                    stats.visit(len(stk))
+                j = R[i]
+                while j != i:
+                    remove(col[j])
+                    j = R[j]
+                stk.append(i)
+
+                if R[0]:
+                    nc = choose()
+                    if siz[nc]:
+                        c = nc
+                        remove(c)
+                        if rng is None:
+                            i = D[c]
+                        else:
+                            orders.append(shuffled(c))
+                            i = orders[-1].pop()
+                        continue
+                    backtracks += 1
+                else:
+                    self.nodes, self.backtracks = nodes, backtracks
+                    suspended = True
+                    yield stk
+                    suspended = False
+
+                # dead end or solution reported, try the next row
+                stk.pop()
+                j = L[i]
+                while j != i:
+                    recover(col[j])
+                    j = L[j]
+                i = D[i] if rng is None else orders[-1].pop()
+        finally:
+            self.nodes, self.backtracks = nodes, backtracks
+            if stats is not None:
+                stats.backtracks += backtracks
+            if suspended:
+                # closed while suspended at a solution or out of budget, unwind every level
+                while stk:
+                    i = stk.pop()
+                    j = L[i]
+                    while j != i:
+                        recover(col[j])
+                        j = L[j]
+                    recover(col[i])
+
+    def dance(self, dep, stk, ans, limit=1, stats=None, rng=None, budget=None, cancel=None):
+        """Dancing Links algorithm main process, the matrix is restored on return
+
+        Returns the number of solutions found, the search stops once it reaches
+        limit, None for no limit. ans receives the first solution, pass None to
+        only count. rng, budget and cancel are passed on to search.
+        """
+        found = 0
+        search = self.search(stats, rng, budget, cancel)
+        try:
+            for chosen in search:
+                if not found and ans is not None:
+                    n = self.size
+                    for k, node in enumerate(chosen):
+                        stk[dep + k] = r = self.row[node]
+                        x = (r - 1) // n // n
+                        y = (r - 1) // n % n
+                        v = (r - 1) % n + 1
+                        ans[x][y] = v
+                found += 1
+                if limit is not None and found >= limit:
+                    break
+        finally:
+            search.close()
+        return found
+
+    def fill(self, chosen, ans):
+        """write the digits of the chosen rows of a solution into the grid ans"""
+        n = self.size
+        row = self.row
+        for node in chosen:
+            r = row[node] - 1
+            ans[r // n // n][r // n % n] = r % n + 1
+
+
+class SudokuDLX(DLX):
+    """DLX holding the exact cover matrix of the empty grid.
+
+    The matrix is built once. Givens are applied by covering the columns of
+    their rows and undone by recovering them in reverse order, so one instance
+    can serve any number of solves without reallocating. box is the
+    (rows, cols) shape of a box, the grid has rows * cols cells per side.
+    """
+
+    def __init__(self, box=(3, 3)):
+        super().__init__()
+        self.box = box
+        self.size = n = box[0] * box[1]
+        self.copy_from(get_template(box))
+        self.covered = []  # columns covered by the givens, in cover order
+        self.selected = []  # rows of the givens, in select order
+        self.stk = [0] * (n * n + 1)  # stack
+
+    def select(self, r):
+        """cover the columns of row r, False if r conflicts with the selected rows"""
+        i = self.first[r]
+        j = i
+        while True:
+            c = self.col[j]
+            if self.R[self.L[c]] != c:
+                return False
+            j = self.R[j]
+            if j == i:
+                break
+        while True:
+            self.remove(self.col[j])
+            self.covered.append(self.col[j])
+            j = self.R[j]
+            if j == i:
+                break
+        self.selected.append(r)
+        return True
 
+    def deselect(self):
+        """recover the columns of the most recently selected row and return it"""
+        r = self.selected.pop()
+        i = j = self.first[r]
+        while True:
+            self.recover(self.covered.pop())
+            j = self.R[j]
+            if j == i:
+                break
+        return r
 
-def get_id(row, col, num):
+    def apply(self, grid):
+        """cover the rows of the givens, False if they conflict"""
+        n = self.size
+        if len(grid) != n:
+            return False
+        for i, row in enumerate(grid):
+            if len(row) != n:
+                return False
+            for j, v in enumerate(row):
+                if v and not (0 < v <= n and self.select(get_id(i + 1, j + 1, v, n))):
+                    return False
+        return True
+
+    def reset(self):
+        """recover every column covered by the givens"""
+        while self.covered:
+            self.recover(self.covered.pop())
+        del self.selected[:]
+
+    def run(self, grid, ans=None, limit=1, stats=None, rng=None, budget=None, cancel=None):
+        """apply the givens, search and reset, returning the number of solutions"""
+        try:
+            if stats is None:
+                if not self.apply(grid):
+                    return 0
+                return self.dance(1, self.stk, ans, limit, None, rng, budget, cancel)
+            start = time.perf_counter()
+            ok = self.apply(grid)
+            now = time.perf_counter()
+            stats.build_time += now - start
+            if not ok:
+                return 0
+            found = self.dance(1, self.stk, ans, limit, stats, rng, budget, cancel)
+            stats.search_time += time.perf_counter() - now
+            return found
+        finally:
+            self.reset()
+
+    def solve(self, grid, stats=None, rng=None, budget=None, cancel=None):
+        """solve the sudoku, the matrix is left empty again afterwards
+
+        rng is an optional random.Random, rows are then tried in random order
+        and the solution found is a random one. A randomized search running
+        past budget rows is restarted with a fresh order and twice the budget,
+        which cuts off the rare runs that wander into a huge subtree. Without
+        rng, or once cancel is set, it gives up instead and returns None with
+        self.aborted set.
+        """
+        while True:
+            ans = [list(row) for row in grid]
+            if self.run(grid, ans, 1, stats, rng, budget, cancel):
+                return ans
+            if not self.aborted or rng is None or cancel is not None and cancel.is_set():
+                return None
+            budget = max(budget, 1) * 2  # a budget of 0 would never grow
+
+    def count_solutions(self, grid, limit=2, stats=None):
+        """count the solutions of the sudoku, stopping once limit is reached, None for no limit"""
+        return self.run(grid, None, limit, stats)
+
+    def iter_solutions(self, grid, limit=None, count_only=False, stats=None):
+        """yield the solutions of the sudoku one by one as the search finds them
+
+        The search is suspended between solutions, so memory stays constant
+        however many there are; the matrix is in use until the generator is
+        exhausted or closed. Stops after limit solutions, None for no limit.
+        count_only yields the running count 1, 2, 3, ... instead of building
+        each grid.
+        """
+        try:
+            if not self.apply(grid):
+                return
+            found = 0
+            search = self.search(stats)
+            try:
+                for chosen in search:
+                    found += 1
+                    if count_only:
+                        yield found
+                    else:
+                        ans = [list(row) for row in grid]
+                        self.fill(chosen, ans)
+                        yield ans
+                    if limit is not None and found >= limit:
+                        break
+            finally:
+                search.close()
+        finally:
+            self.reset()
+
+
+def get_id(row, col, num, n=9):
     """get the id of the node"""
-    return (row - 1) * 9 * 9 + (col - 1) * 9 + num
+    return (row - 1) * n * n + (col - 1) * n + num
 
 
-def insert(solver, row, col, num):
+def insert(solver, row, col, num, box=(3, 3)):
     """insert the constraints of the sudoku"""
-    dx = (row - 1) // 3 + 1
-    dy = (col - 1) // 3 + 1
-    room = (dx - 1) * 3 + dy
-    id = get_id(row, col, num)
+    box_rows, box_cols = box
+    n = box_rows * box_cols
+    room = (row - 1) // box_rows * box_rows + (col - 1) // box_cols + 1
+    id = get_id(row, col, num, n)
     
     # four constraints
-    f1 = (row - 1) * 9 + num  # row constraint
-    f2 = 81 + (col - 1) * 9 + num  # column constraint
-    f3 = 81 * 2 + (room - 1) * 9 + num  # box constraint
-    f4 = 81 * 3 + (row - 1) * 9 + col  # cell constraint
+    f1 = (row - 1) * n + num  # row constraint
+    f2 = n * n + (col - 1) * n + num  # column constraint
+    f3 = n * n * 2 + (room - 1) * n + num  # box constraint
+    f4 = n * n * 3 + (row - 1) * n + col  # cell constraint
     
     solver.insert(id, f1)
     solver.insert(id, f2)
@@ -133,45 +484,121 @@ def insert(solver, row, col, num):
     solver.insert(id, f4)
 
 
-def solve_sudoku(grid):
-    """solve the sudoku"""
-    solver = DLX()
-    solver.build(729, 324)  # 729 possible positions, 324 constraints
-    
-    # build the constraint matrix
-    for i in range(1, 10):
-        for j in range(1, 10):
-            for v in range(1, 10):
-                if grid[i-1][j-1] and grid[i-1][j-1] != v:
-                    continue
-                insert(solver, i, j, v)
-    
-    # solve
-    stk = [0] * 1000  # stack
-    ans = [[0] * 9 for _ in range(9)]  # answer array
-    
-    # copy the original sudoku to the answer array
-    for i in range(9):
-        for j in range(9):
-            ans[i][j] = grid[i][j]
-    
-    if solver.dance(1, stk, ans):
-        return ans
-    return None
+_constraints = {}  # constraint table per box shape
+_templates = {}  # linked empty-grid matrix per box shape
+
+
+def constraint_table(box=(3, 3)):
+    """the four constraint columns of every row id, computed once per box shape
+
+    Entry id holds (row, column, box, cell) constraint columns of the row id
+    of get_id, entry 0 is unused.
+    """
+    table = _constraints.get(box)
+    if table is None:
+        box_rows, box_cols = box
+        n = box_rows * box_cols
+        table = [None]
+        for row in range(n):
+            for col in range(n):
+                room = row // box_rows * box_rows + col // box_cols
+                for num in range(1, n + 1):
+                    table.append((row * n + num,
+                                  n * n + col * n + num,
+                                  n * n * 2 + room * n + num,
+                                  n * n * 3 + row * n + col + 1))
+        table = _constraints[box] = tuple(table)
+    return table
+
+
+def get_template(box=(3, 3)):
+    """the fully linked matrix of the empty grid, built once per box shape
+
+    SudokuDLX instances start from a copy of it, which is a handful of list
+    slices instead of splicing every node in again.
+    """
+    template = _templates.get(box)
+    if template is None:
+        n = box[0] * box[1]
+        template = DLX()
+        template.build(n ** 3, 4 * n * n)  # n^3 possible positions, 4n^2 constraints
+        for id, columns in enumerate(constraint_table(box)):
+            if columns is None:
+                continue
+            for c in columns:
+                template.insert(id, c)
+        _templates[box] = template
+    return template
+
+
+def box_shape(n):
+    """the (rows, cols) box shape of an n x n grid, as close to square as possible"""
+    box_rows = int(n ** 0.5)
+    while n % box_rows:
+        box_rows -= 1
+    return box_rows, n // box_rows
+
+
+_solvers = thread_local()  # SudokuDLX per box shape and thread, built on first use
+
+
+def get_solver(box=(3, 3)):
+    """get the calling thread's SudokuDLX instance for a box shape
+
+    Searching mutates the matrix, so every thread gets its own instance and
+    the module-level functions can be called from several threads at once.
+    """
+    solvers = _solvers.__dict__
+    solver = solvers.get(box)
+    if solver is None:
+        solver = solvers[box] = SudokuDLX(box)
+    return solver
+
+
+def solve_sudoku(grid, stats=None, box=None, rng=None, budget=None):
+    """solve the sudoku, stats is an optional SolverStats to fill in
+
+    box is the (rows, cols) box shape, by default the squarest one fitting
+    the grid size, so 4x4, 6x6, 12x12, 16x16 and 25x25 grids work as is.
+    rng and budget randomize the search, see SudokuDLX.solve.
+    """
+    box = box or box_shape(len(grid))
+    if stats is None:
+        return get_solver(box).solve(grid, None, rng, budget)
+    start = time.perf_counter()
+    solver = get_solver(box)
+    stats.build_time += time.perf_counter() - start  # matrix build on first use
+    return solver.solve(grid, stats, rng, budget)
+
+
+def count_solutions(grid, limit=2, stats=None, box=None):
+    """count the solutions of the sudoku, stopping once limit is reached, None for no limit"""
+    return get_solver(box or box_shape(len(grid))).count_solutions(grid, limit, stats)
+
+
+def iter_solutions(grid, limit=None, count_only=False, box=None):
+    """yield the solutions of the sudoku lazily, see SudokuDLX.iter_solutions
+
+    The generator runs on a solver of its own, so other solves can run while
+    it is suspended.
+    """
+    return SudokuDLX(box or box_shape(len(grid))).iter_solutions(grid, limit, count_only)
 
 
-def print_sudoku(grid):
+def print_sudoku(grid, box=None):
     """print the sudoku"""
-    for i in range(9):
-        if i % 3 == 0 and i != 0:
-            print("- - - - - - - - - - -")
-        for j in range(9):
-            if j % 3 == 0 and j != 0:
-                print("|", end=" ")
-            if j == 8:
-                print(grid[i][j])
-            else:
-                print(str(grid[i][j]) + " ", end="")
+    n = len(grid)
+    box_rows, box_cols = box or box_shape(n)
+    width = len(str(n))
+    for i in range(n):
+        if i % box_rows == 0 and i != 0:
+            print(" ".join("-" * width for _ in range(n + n // box_cols - 1)))
+        line = []
+        for j in range(n):
+            if j % box_cols == 0 and j != 0:
+                line.append("|".rjust(width))
+            line.append(str(grid[i][j]).rjust(width))
+        print(" ".join(line))
 
 
 # example
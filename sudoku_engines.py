@@ -0,0 +1,218 @@
+import time
+
+from sudoku_dlx import box_shape, thread_local
+
+ENGINES = {}  # engine name -> factory returning a solve(grid) callable
+ENGINE_SIZES = {}  # engine name -> the grid sizes it solves, None for any
+SELECTORS = ("auto", "race")  # the entries that pick other engines instead of solving
+PROCESS_ENGINES = ("race",)  # entries that start processes, which daemonic pool workers cannot
+
+
+def register_engine(name, factory, sizes=None):
+    """add an engine to the registry, replacing any engine of the same name
+
+    factory() returns a solve(grid) callable, grid a list of row lists or a
+    sudoku_grid.Grid, returning the solution as row lists or None. It is
+    called once per thread using the engine. sizes are the grid sizes the
+    engine solves, None for any.
+    """
+    ENGINES[name] = factory
+    ENGINE_SIZES[name] = None if sizes is None else tuple(sizes)
+    _engines.__dict__.pop(name, None)
+
+
+def supports(name, size):
+    """whether an engine solves size x size grids"""
+    sizes = ENGINE_SIZES[name]
+    return sizes is None or size in sizes
+
+
+_engines = thread_local()  # solve callables per engine name and thread, built on first use
+
+
+def get_engine(name):
+    """get the calling thread's solve callable of a registered engine"""
+    engines = _engines.__dict__
+    solve = engines.get(name)
+    if solve is None:
+        try:
+            factory = ENGINES[name]
+        except KeyError:
+            raise ValueError("unknown engine %r, expected one of %s" % (name, ", ".join(sorted(ENGINES))))
+        solve = engines[name] = factory()
+    return solve
+
+
+def solve(grid, engine="auto"):
+    """solve the sudoku with a registered engine, "auto" picks one per puzzle"""
+    return get_engine(engine)(grid)
+
+
+def features(grid, box=None):
+    """(clues, singles) of a puzzle, the cheap features auto selection uses
+
+    clues is the number of filled cells, singles the number of empty cells
+    one propagation pass fills, those left with a single candidate.
+    """
+    n = len(grid)
+    box_rows, box_cols = box or box_shape(n)
+    stride = n // box_cols  # boxes per band
+    rows, cols, boxes = [0] * n, [0] * n, [0] * n
+    empty = []
+    for r, row in enumerate(grid):
+        b0 = r // box_rows * stride
+        for c, v in enumerate(row):
+            if v:
+                bit = 1 << v
+                rows[r] |= bit
+                cols[c] |= bit
+                boxes[b0 + c // box_cols] |= bit
+            else:
+                empty.append((r, c))
+    full = (1 << (n + 1)) - 2  # bit d for digit d
+    singles = 0
+    for r, c in empty:
+        m = full & ~(rows[r] | cols[c] | boxes[r // box_rows * stride + c // box_cols])
+        if m and not m & (m - 1):
+            singles += 1
+    return n * n - len(empty), singles
+
+
+class AutoPolicy:
+    """Pick an engine per puzzle from its features, see features.
+
+    points are (clues, singles, engine) triples, typically the mean features
+    of a benchmark corpus and the engine that was fastest on it; a puzzle
+    goes to the engine of the nearest point. Grids the picked engine cannot
+    solve go to fallback.
+    """
+
+    __slots__ = ("points", "fallback")
+
+    def __init__(self, points, fallback="dlx"):
+        self.points = [tuple(point) for point in points]
+        self.fallback = fallback
+
+    def choose(self, grid):
+        """the name of the engine for grid"""
+        clues, singles = features(grid)
+        engine = min(self.points, key=lambda p: (p[0] - clues) ** 2 + (p[1] - singles) ** 2)[2]
+        return engine if supports(engine, len(grid)) else self.fallback
+
+    @classmethod
+    def from_report(cls, report, engines=None, fallback="dlx"):
+        """tune a policy from a sudoku_bench report
+
+        Every corpus of the report adds a point at its mean features for the
+        engine with the lowest mean latency on it, among engines if given.
+        """
+        corpora = {c["corpus"]: c for c in report.get("corpora", ()) if c["puzzles"]}
+        best = {}
+        for result in report["results"]:
+            engine, corpus = result["engine"], result["corpus"]
+            if (result.get("status") != "ok" or corpus not in corpora or engine in SELECTORS
+                    or engine not in ENGINES or engines is not None and engine not in engines):
+                continue
+            if corpus not in best or result["mean"] < best[corpus]["mean"]:
+                best[corpus] = result
+        if not best:
+            raise ValueError("no corpus with features and results to tune from")
+        return cls([(corpora[c]["clues"], corpora[c]["singles"], r["engine"]) for c, r in best.items()],
+                   fallback)
+
+    def __repr__(self):
+        return "AutoPolicy(%r, %r)" % (self.points, self.fallback)
+
+
+# sudoku_bench on the bundled corpora: bitmask is ~17x faster than dlx on the
+# easy set and slightly faster on the hardest one, dlx ~2.5x faster on the
+# 17-clue hard set
+_policy = AutoPolicy([(53.8, 15.8, "bitmask"), (17.0, 0.0, "dlx"), (23.5, 0.5, "bitmask")])
+
+
+def get_policy():
+    """get the AutoPolicy of the "auto" engine"""
+    return _policy
+
+
+def set_policy(policy):
+    """replace the AutoPolicy of the "auto" engine, e.g. with AutoPolicy.from_report"""
+    global _policy
+    _policy = policy
+
+
+def solve_auto(grid, policy=None):
+    """solve the sudoku with the engine policy, by default the module's, picks"""
+    return get_engine((policy or _policy).choose(grid))(grid)
+
+
+RACE_ENGINES = ("dlx", "bitmask")
+
+
+def _race_worker(engine, grid, conn):
+    conn.send(get_engine(engine)(grid))
+    conn.close()
+
+
+def race(grid, engines=RACE_ENGINES, timeout=None):
+    """solve the sudoku with several engines at once, a process each
+
+    Returns (engine, solution) of whichever engine answers first and kills
+    the others. Engines that cannot solve the grid size are left out, a
+    single one left runs in the calling process. Starting the processes costs
+    a few milliseconds, so racing pays off on hard puzzles only. Raises
+    TimeoutError after timeout seconds.
+    """
+    engines = [engine for engine in engines if supports(engine, len(grid))]
+    if not engines:
+        raise ValueError("none of the engines solves %dx%d grids" % (len(grid), len(grid)))
+    if len(engines) == 1:
+        return engines[0], get_engine(engines[0])(grid)
+    import multiprocessing
+    from multiprocessing.connection import wait
+    workers = {}  # pipe end -> (engine, process)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    try:
+        for engine in engines:
+            reader, writer = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=_race_worker, args=(engine, grid, writer), daemon=True)
+            process.start()
+            writer.close()
+            workers[reader] = engine, process
+        pending = list(workers)
+        while pending:
+            ready = wait(pending, None if deadline is None else max(0, deadline - time.monotonic()))
+            if not ready:
+                raise TimeoutError("no engine answered within %s seconds" % timeout)
+            for reader in ready:
+                try:
+                    return workers[reader][0], reader.recv()
+                except EOFError:
+                    pending.remove(reader)  # the engine failed, the others race on
+        raise RuntimeError("every engine failed on the puzzle")
+    finally:
+        for reader, (_, process) in workers.items():
+            process.kill()
+            process.join()
+            reader.close()
+
+
+def _dlx_engine():
+    from sudoku_dlx import solve_sudoku
+    return solve_sudoku
+
+
+def _solver_engine(name):
+    def factory():
+        import sudoku_solver
+        return getattr(sudoku_solver, name)().solve
+    return factory
+
+
+register_engine("dlx", _dlx_engine)
+register_engine("dancing_links", _solver_engine("DancingLinksSolver"), (9,))
+register_engine("bitmask", _solver_engine("BitmaskSolver"), (9,))
+register_engine("constraint_propagation", _solver_engine("ConstraintPropagationSolver"), (9,))
+register_engine("backtracking", _solver_engine("BacktrackingSolver"), (9,))
+register_engine("auto", lambda: solve_auto)
+register_engine("race", lambda: lambda grid: race(grid)[1])
@@ -1,56 +1,335 @@
 import random
-from sudoku_dlx import DLX, solve_sudoku, print_sudoku
+from sudoku_dlx import box_shape, count_solutions, get_id, get_solver, print_sudoku
+from sudoku_logic import solve_logically
 
 
-def generate_solution():
-    """generate a complete sudoku solution"""
-    # create an empty sudoku grid
-    grid = [[0] * 9 for _ in range(9)]
-    
-    # randomly fill the first row
-    first_row = list(range(1, 10))
-    random.shuffle(first_row)
-    grid[0] = first_row
-    
-    # use the solver to complete the rest
-    solution = solve_sudoku(grid)
-    return solution
+RESTART_BUDGET = 4  # rows per cell a randomized solution search tries before restarting
+SEED_GRIDS = 16  # seed solutions kept per box shape for the transform fast path
+_seed_grids = {}
+
+
+def seed_grids(box=(3, 3)):
+    """the seed solutions of a box shape, searched once per process
+
+    The seeds are drawn from fixed seeds, so every process gets the same ones
+    and seeded generation stays reproducible across worker processes.
+    """
+    grids = _seed_grids.get(box)
+    if grids is None:
+        grids = _seed_grids[box] = [
+            search_solution(random.Random("seed grid %d %d %d" % (box[0], box[1], k)), box)
+            for k in range(SEED_GRIDS)]
+    return grids
+
+
+def transform_solution(grid, rng=None, box=(3, 3)):
+    """apply a random validity-preserving transform to a complete grid
+
+    Relabels the digits, permutes rows within bands, bands, columns within
+    stacks and stacks, and transposes square-box grids half of the time.
+    """
+    if rng is None:
+        rng = random
+    box_rows, box_cols = box
+    n = box_rows * box_cols
+    digits = list(range(1, n + 1))
+    rng.shuffle(digits)
+    rows = []
+    for band in rng.sample(range(n // box_rows), n // box_rows):
+        rows.extend(band * box_rows + r for r in rng.sample(range(box_rows), box_rows))
+    cols = []
+    for stack in rng.sample(range(n // box_cols), n // box_cols):
+        cols.extend(stack * box_cols + c for c in rng.sample(range(box_cols), box_cols))
+    result = [[digits[grid[r][c] - 1] for c in cols] for r in rows]
+    if box_rows == box_cols and rng.random() < 0.5:
+        result = [list(col) for col in zip(*result)]
+    return result
+
+
+def generate_solution(rng=None, box=(3, 3), unbiased=False):
+    """generate a complete sudoku solution, box is the (rows, cols) box shape
+
+    By default a random seed grid is randomly transformed, which needs no
+    search. unbiased=True searches a fresh grid with DLX instead, for when
+    the distribution of grids matters more than speed.
+    """
+    if rng is None:
+        rng = random
+    if unbiased:
+        return search_solution(rng, box)
+    return transform_solution(rng.choice(seed_grids(box)), rng, box)
+
+
+def search_solution(rng=None, box=(3, 3)):
+    """search a random complete sudoku solution with randomized DLX
+
+    Every branch tries its rows in random order, and a search running past
+    RESTART_BUDGET rows per cell is restarted, see SudokuDLX.solve.
+    """
+    if rng is None:
+        rng = random
+    n = box[0] * box[1]
+    grid = [[0] * n for _ in range(n)]
+    return get_solver(box).solve(grid, rng=rng, budget=RESTART_BUDGET * n * n)
+
 
 def is_unique_solution(grid):
     """check if the sudoku has a unique solution"""
-    # try to solve
-    solution = solve_sudoku(grid)
-    if not solution:
-        return False
-    
-    # find the first empty cell
-    for i in range(9):
-        for j in range(9):
-            if grid[i][j] == 0:
-                # try to fill in different numbers
-                for num in range(1, 10):
-                    if num != solution[i][j]:
-                        # save the original value
-                        original = grid[i][j]
-                        grid[i][j] = num
-                        # check if there is another solution
-                        if solve_sudoku(grid):
-                            grid[i][j] = original
-                            return False
-                        grid[i][j] = original
-                return True
-    return True
-
-def generate_sudoku(difficulty="medium"):
-    """generate a random sudoku puzzle"""
+    return count_solutions(grid, limit=2) == 1
+
+
+# score ranges targeted by generate_rated for the named difficulties
+DIFFICULTY_SCORES = {
+    "easy": (0, 0),
+    "medium": (1, 19),
+    "hard": (20, 99),
+    "expert": (100, None),
+}
+
+
+def rate_sudoku(puzzle, box=None):
+    """rate a puzzle by the search effort needed to prove its solution unique
+
+    The score counts the DLX nodes tried and dead ends hit beyond one node per
+    empty cell, so 0 means singles alone solve the puzzle. Returns None if the
+    puzzle does not have exactly one solution.
+    """
+    solver = get_solver(box or box_shape(len(puzzle)))
+    if solver.count_solutions(puzzle, 2) != 1:
+        return None
+    empty = sum(not v for row in puzzle for v in row)
+    return solver.nodes + solver.backtracks - empty
+
+
+def unavoidable_rectangles(solution, box=(3, 3)):
+    """the unavoidable rectangles of a solution
+
+    Four cells in two rows, two columns and two boxes holding a b / b a form
+    a rectangle: swapping a and b in them gives another solution, so a puzzle
+    keeping none of the four cells is never unique.
+    """
+    box_rows, box_cols = box
+    n = len(solution)
+    rects = []
+    for r1 in range(n):
+        for r2 in range(r1 + 1, n):
+            same_band = r1 // box_rows == r2 // box_rows
+            row1, row2 = solution[r1], solution[r2]
+            for c1 in range(n):
+                for c2 in range(c1 + 1, n):
+                    # two boxes: same band and different stacks, or the other way round
+                    if same_band == (c1 // box_cols == c2 // box_cols):
+                        continue
+                    if row1[c1] == row2[c2] and row1[c2] == row2[c1]:
+                        rects.append(((r1, c1), (r1, c2), (r2, c1), (r2, c2)))
+    return rects
+
+
+class RemovalSearch:
+    """Removal attempts on one exact cover structure kept across attempts.
+
+    The givens stay covered on the shared DLX between attempts. Groups of
+    cells are covered in reverse test order, so the next group to test sits
+    just below the groups that had to be kept; those are lifted off, the group
+    is uncovered and the kept ones are covered again. A rejected group is
+    simply covered again on top. Each attempt then costs a handful of row
+    covers plus the bounded uniqueness search, never a matrix rebuild.
+
+    The puzzle before a removal has the unique solution it was cut from, so a
+    second solution must differ from it in one of the removed cells. Unless
+    rated, an attempt only looks for a solution with the solution's row of each
+    removed cell hidden in turn, which fails fast instead of exhausting the
+    whole search tree the way counting to two does. Rated searches count, so
+    that score holds the puzzle's rate_sudoku score after each attempt.
+
+    A removal that would empty one of the solution's unavoidable rectangles is
+    rejected without searching.
+    """
+
+    def __init__(self, solution, groups, solver=None, rated=False):
+        self.solver = solver or get_solver(box_shape(len(solution)))
+        self.rated = rated
+        self.score = 0
+        self.solution = solution
+        self.puzzle = [row[:] for row in solution]
+        self.pending = list(reversed(groups))  # groups still to test, next one last
+        self.kept = []  # groups that must stay, covered above the pending ones
+        self.empty = 0
+        self.rects = {}  # cell -> indices of the rectangles holding it
+        self.clues = []  # clues left in each rectangle
+        for k, rect in enumerate(unavoidable_rectangles(solution, self.solver.box)):
+            self.clues.append(len(rect))
+            for cell in rect:
+                self.rects.setdefault(cell, []).append(k)
+        self.solver.reset()
+        for group in self.pending:
+            self._cover(group)
+
+    def _row(self, i, j):
+        return get_id(i + 1, j + 1, self.solution[i][j], self.solver.size)
+
+    def _cover(self, group):
+        for i, j in group:
+            self.solver.select(self._row(i, j))
+
+    def _uncover(self, group):
+        for _ in group:
+            self.solver.deselect()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def _has_other_solution(self, group):
+        """whether some solution differs from self.solution in a cell of group"""
+        solver = self.solver
+        selected = 0
+        try:
+            for i, j in group:
+                r = self._row(i, j)
+                solver.hide(r)
+                found = solver.dance(1, solver.stk, None, 1)
+                solver.unhide(r)
+                if found:
+                    return True
+                # any other solution now has to differ in a later cell
+                solver.select(r)
+                selected += 1
+            return False
+        finally:
+            for _ in range(selected):
+                solver.deselect()
+
+    def _empties_rectangle(self, group):
+        """whether removing group would leave a rectangle without clues"""
+        hit = {}
+        for cell in group:
+            for k in self.rects.get(cell, ()):
+                hit[k] = hit.get(k, 0) + 1
+        return any(self.clues[k] == count for k, count in hit.items())
+
+    def attempt(self, max_score=None):
+        """try to remove the next group of cells
+
+        The removal is kept if the puzzle still has a unique solution and, for
+        rated searches, its score (see rate_sudoku) is at most max_score.
+        Returns whether the removal was kept, the cells are restored otherwise.
+        """
+        group = self.pending.pop()
+        if self._empties_rectangle(group):
+            # still covered just below the kept groups, which only ever get
+            # uncovered and covered again all together
+            self.kept.append(group)
+            return False
+        for kept in reversed(self.kept):
+            self._uncover(kept)
+        self._uncover(group)
+        for kept in self.kept:
+            self._cover(kept)
+
+        solver = self.solver
+        empty = self.empty + len(group)
+        if self.rated:
+            keep = solver.dance(1, solver.stk, None, 2) == 1
+            score = solver.nodes + solver.backtracks - empty
+            keep = keep and (max_score is None or score <= max_score)
+        else:
+            keep = not self._has_other_solution(group)
+        if not keep:
+            self._cover(group)
+            self.kept.append(group)
+            return False
+        if self.rated:
+            self.score = score
+        self.empty = empty
+        for i, j in group:
+            self.puzzle[i][j] = 0
+            for k in self.rects.get((i, j), ()):
+                self.clues[k] -= 1
+        return True
+
+    def close(self):
+        """recover every covered column of the shared solver"""
+        self.solver.reset()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def symmetric_pairs(rng, n=9):
+    """cell groups symmetric under 180 degree rotation, in random order"""
+    m = n - 1
+    groups = [((i, j), (m - i, m - j)) if (i, j) != (m - i, m - j) else ((i, j),)
+              for i in range(n) for j in range(n) if (i, j) <= (m - i, m - j)]
+    rng.shuffle(groups)
+    return groups
+
+
+def single_cells(rng, n=9):
+    """every cell as a group of its own, in random order"""
+    groups = [((i, j),) for i in range(n) for j in range(n)]
+    rng.shuffle(groups)
+    return groups
+
+
+def generate_rated(target="hard", rng=None, budget=20000, box=(3, 3), unbiased=False):
+    """generate a puzzle whose difficulty score falls in a target range
+
+    target is a name from DIFFICULTY_SCORES, a (low, high) score range with
+    high None for no limit, or a minimum score. Symmetric pairs of cells are
+    removed while the solution stays unique and the score stays at most high,
+    stopping once the score reaches low; a low of 0 keeps removing for as long
+    as possible. A grid that runs out of removable pairs below low is replaced
+    by a fresh one, until budget removal attempts have been spent.
+    Returns (puzzle, solution, score) for the first puzzle in range, None if
+    the budget runs out first. The named ranges are calibrated for 9x9 grids;
+    "medium" and "hard" take about 120 attempts and "expert" about 1100, 6500
+    at worst in 40 seeded runs, well within the default budget. unbiased is
+    passed on to generate_solution.
+    """
+    if rng is None:
+        rng = random
+    if isinstance(target, str):
+        target = DIFFICULTY_SCORES[target]
+    low, high = target if isinstance(target, tuple) else (target, None)
+    while True:
+        solution = generate_solution(rng, box, unbiased)
+        with RemovalSearch(solution, symmetric_pairs(rng, len(solution)), get_solver(box), rated=True) as search:
+            while search and not (low and search.score >= low) and budget > 0:
+                budget -= 1
+                search.attempt(high)
+            puzzle, score = search.puzzle, search.score
+        if score >= low:
+            return puzzle, solution, score
+        if budget <= 0:
+            return None
+
+
+def generate_sudoku(difficulty="medium", rng=None, box=(3, 3), unbiased=False,
+                    minimal=False, symmetric=True):
+    """generate a random sudoku puzzle, rng is a random.Random to draw from
+
+    box is the (rows, cols) box shape, e.g. (2, 3) for 6x6 or (4, 4) for 16x16
+    grids; the number of cells removed scales with the grid area. unbiased is
+    passed on to generate_solution.
+
+    minimal=True ignores difficulty and removes clues until none can go
+    without losing uniqueness. A clue that cannot be removed never can once
+    more clues are gone, so a single pass testing each clue once is enough.
+    symmetric=False removes single cells instead of pairs symmetric under 180
+    degree rotation; symmetric minimal puzzles are only minimal among
+    symmetric removals.
+    """
+    if rng is None:
+        rng = random
+    n = box[0] * box[1]
     # generate a complete solution
-    solution = generate_solution()
+    solution = generate_solution(rng, box, unbiased)
     if not solution:
         return None
     
-    # create a puzzle copy
-    puzzle = [row[:] for row in solution]
-    
     # determine the number of cells to remove based on difficulty
     if difficulty == "easy":
         cells_to_remove = 30
@@ -60,42 +339,80 @@ def generate_sudoku(difficulty="medium"):
         cells_to_remove = 50
     else:
         cells_to_remove = 45
+    cells_to_remove = n * n if minimal else cells_to_remove * n * n // 81
     
-    # get all positions
-    positions = [(i, j) for i in range(9) for j in range(9)]
-    random.shuffle(positions)
-    
-    # remove cells symmetrically
-    removed = 0
-    for i, j in positions:
-        if removed >= cells_to_remove:
-            break
-            
-        # symmetric positions
-        sym_i = 8 - i
-        sym_j = 8 - j
-        
-        # remove the number
-        puzzle[i][j] = 0
-        puzzle[sym_i][sym_j] = 0
-        removed += 2
-        
-        # check if there is still a unique solution
-        if not is_unique_solution(puzzle):
-            # if there is no unique solution, restore the number
-            puzzle[i][j] = solution[i][j]
-            puzzle[sym_i][sym_j] = solution[sym_i][sym_j]
-            removed -= 2
+    # remove cells while the solution stays unique
+    groups = symmetric_pairs(rng, n) if symmetric else single_cells(rng, n)
+    with RemovalSearch(solution, groups, get_solver(box)) as search:
+        while search and search.empty < cells_to_remove:
+            search.attempt()
+        puzzle = search.puzzle
     
     return puzzle, solution
 
 
-def print_sudoku_with_solution(puzzle, solution):
+def generate_graded(grade="medium", rng=None, box=(3, 3), attempts=200, symmetric=True):
+    """generate a minimal puzzle whose hardest needed technique has a given grade
+
+    grade is one of sudoku_logic.GRADES. Puzzles that need guessing are
+    rejected, as are puzzles of another grade. Returns (puzzle, solution,
+    steps) with the logical solution path, or None if attempts puzzles go by
+    without a match. Grades are far from even among minimal 9x9 puzzles:
+    about 65% are easy, 10% medium, 8% expert and 0.3% hard (0.5% with
+    symmetric False), the rest need guessing. "hard" takes about 350
+    attempts on average, at 6-10ms each, so the default misses it often.
+    """
+    if rng is None:
+        rng = random
+    for _ in range(attempts):
+        puzzle, solution = generate_sudoku(rng=rng, box=box, minimal=True, symmetric=symmetric)
+        result = solve_logically(puzzle, box)
+        if result.grade == grade:
+            return puzzle, solution, result.steps
+    return None
+
+
+def _generate_chunk(task):
+    """generate a chunk of puzzles in a worker from the chunk's own seed"""
+    count, seed, options = task
+    rng = random.Random(seed)
+    return [generate_sudoku(rng=rng, **options) for _ in range(count)]
+
+
+def generate_batch(n, difficulty="medium", workers=None, seed=None, chunksize=50, box=(3, 3),
+                   unbiased=False, minimal=False, symmetric=True):
+    """generate n sudoku puzzles across a pool of worker processes
+
+    Yields (puzzle, solution) pairs as soon as each chunk of puzzles is done,
+    in completion order. Every chunk draws from a random.Random seeded from
+    seed and the chunk index, so a given seed yields the same set of puzzles
+    whatever the number of workers. Each worker process reuses its shared
+    solver for all the puzzles it generates. workers defaults to the CPU count,
+    workers=1 generates in the calling process. The other arguments are
+    passed on to generate_sudoku.
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 64)
+    options = {"difficulty": difficulty, "box": box, "unbiased": unbiased,
+               "minimal": minimal, "symmetric": symmetric}
+    tasks = [(min(chunksize, n - start), "%s:%d" % (seed, start), options)
+             for start in range(0, n, chunksize)]
+    if workers == 1:
+        for task in tasks:
+            yield from _generate_chunk(task)
+        return
+    import multiprocessing
+    with multiprocessing.Pool(workers) as pool:
+        for chunk in pool.imap_unordered(_generate_chunk, tasks):
+            yield from chunk
+
+
+def print_sudoku_with_solution(puzzle, solution, box=None):
     """print the sudoku puzzle and solution"""
     print("sudoku puzzle:")
-    print_sudoku(puzzle)
+    print_sudoku(puzzle, box)
     print("\nsolution:")
-    print_sudoku(solution)
+    print_sudoku(solution, box)
 
 
 # example
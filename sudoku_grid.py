@@ -0,0 +1,118 @@
+# text form of a cell value: '.' for empty, then 1-9 and A-Z for grids above 9x9
+SYMBOLS = b".123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_ENCODE = SYMBOLS + bytes(range(len(SYMBOLS), 256))
+_DECODE = bytearray(b"\xff" * 256)  # 0xff marks characters that are not cells
+for _value, _symbol in enumerate(SYMBOLS):
+    _DECODE[_symbol] = _DECODE[ord(chr(_symbol).lower())] = _value
+_DECODE[ord("0")] = 0
+_DECODE = bytes(_DECODE)
+
+
+class Grid:
+    """A sudoku grid packed into one byte per cell, row by row, 0 for empty.
+
+    grid[r] is row r as bytes, so grid[r][c], len(grid) and iterating the rows
+    read like a list of lists and every engine accepts a Grid where it takes
+    one. grid[r, c] reads a cell and grid[r, c] = v writes one. Copies share
+    their cells until one of them is written to, and hashing freezes the
+    cells into bytes whose hash Python caches, so grids are cheap to copy and
+    to use as keys; don't write to a grid while it is one.
+    """
+
+    __slots__ = ("cells", "size")
+
+    def __init__(self, cells, size=None):
+        # bytes are shared as is, anything else is copied once
+        self.cells = cells if type(cells) is bytes else bytes(cells)
+        n = round(len(self.cells) ** 0.5) if size is None else size
+        if n * n != len(self.cells):
+            raise ValueError("expected a square number of cells, got %d" % len(self.cells))
+        self.size = n
+
+    @classmethod
+    def from_rows(cls, rows):
+        """pack a list of row lists"""
+        return cls(b"".join(map(bytes, rows)), len(rows))
+
+    @classmethod
+    def from_string(cls, line):
+        """parse the line format, one character per cell, '.' or '0' for empty"""
+        cells = line.strip().encode("ascii").translate(_DECODE)
+        if b"\xff" in cells:
+            raise ValueError("invalid character in %r" % line)
+        return cls(cells)
+
+    def to_string(self):
+        """the line format, '.' for empty cells"""
+        return self.cells.translate(_ENCODE).decode("ascii")
+
+    def to_list(self):
+        """unpack into a list of row lists"""
+        n = self.size
+        cells = self.cells
+        return [list(cells[i:i + n]) for i in range(0, n * n, n)]
+
+    @property
+    def clues(self):
+        """the number of filled cells"""
+        return len(self.cells) - self.cells.count(0)
+
+    def copy(self):
+        """a copy sharing the cells until either grid is written to"""
+        if type(self.cells) is not bytes:
+            self.cells = bytes(self.cells)
+        return Grid(self.cells, self.size)
+
+    __copy__ = copy
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def __reduce__(self):
+        return Grid, (bytes(self.cells), self.size)
+
+    def __bytes__(self):
+        return bytes(self.cells)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, key):
+        n = self.size
+        if type(key) is tuple:
+            r, c = key
+            return self.cells[r * n + c]
+        if not 0 <= key < n:
+            if -n <= key < 0:
+                key += n
+            else:
+                raise IndexError("row index out of range")
+        return self.cells[key * n:key * n + n]
+
+    def __setitem__(self, key, value):
+        r, c = key
+        if type(self.cells) is bytes:
+            self.cells = bytearray(self.cells)  # copy on the first write
+        self.cells[r * self.size + c] = value
+
+    def __iter__(self):
+        cells, n = self.cells, self.size
+        return (cells[i:i + n] for i in range(0, n * n, n))
+
+    def __eq__(self, other):
+        if isinstance(other, Grid):
+            return self.cells == other.cells
+        if isinstance(other, list):
+            return self.to_list() == other
+        return NotImplemented
+
+    def __hash__(self):
+        if type(self.cells) is not bytes:
+            self.cells = bytes(self.cells)
+        return hash(self.cells)
+
+    def __str__(self):
+        return self.to_string()
+
+    def __repr__(self):
+        return "Grid(%r)" % self.to_string()
@@ -0,0 +1,413 @@
+import itertools
+import time
+
+from sudoku_dlx import box_shape, thread_local
+from sudoku_solver import Solver
+
+# (technique, grade) in the order they are tried, cheapest first
+TECHNIQUES = (
+    ("naked single", "easy"),
+    ("hidden single", "easy"),
+    ("locked candidates", "medium"),
+    ("naked pair", "medium"),
+    ("hidden pair", "medium"),
+    ("naked triple", "hard"),
+    ("hidden triple", "hard"),
+    ("x-wing", "hard"),
+    ("xy-wing", "expert"),
+    ("swordfish", "expert"),
+    ("simple coloring", "expert"),
+)
+GRADES = ("easy", "medium", "hard", "expert")
+
+_rank = {name: k for k, (name, _) in enumerate(TECHNIQUES)}
+_grade = dict(TECHNIQUES)
+
+
+class Step:
+    """One deduction: the technique used and what it placed and eliminated.
+
+    placed and eliminated hold (row, col, digit) triples, rows and columns
+    counted from 0.
+    """
+
+    __slots__ = ("technique", "placed", "eliminated")
+
+    def __init__(self, technique, placed=(), eliminated=()):
+        self.technique = technique
+        self.placed = list(placed)
+        self.eliminated = list(eliminated)
+
+    def __repr__(self):
+        return "Step(%r, placed=%r, eliminated=%r)" % (self.technique, self.placed, self.eliminated)
+
+
+class LogicResult:
+    """What LogicSolver.run got to.
+
+    grid is the puzzle with every digit placed by logic, 0 where it got
+    stuck. solved is False if the puzzle needs guessing or, with
+    contradiction set, has no solution.
+    """
+
+    __slots__ = ("grid", "steps", "solved", "contradiction")
+
+    def __init__(self, grid, steps, solved, contradiction):
+        self.grid = grid
+        self.steps = steps
+        self.solved = solved
+        self.contradiction = contradiction
+
+    @property
+    def hardest(self):
+        """the most advanced technique used, None if no step was needed"""
+        if not self.steps:
+            return None
+        return max((step.technique for step in self.steps), key=_rank.get)
+
+    @property
+    def grade(self):
+        """the grade of the hardest technique, None unless solved"""
+        if not self.solved:
+            return None
+        return _grade[self.hardest] if self.steps else GRADES[0]
+
+
+class LogicSolver(Solver):
+    """Solve without guessing, applying human techniques in cost order.
+
+    Candidates are kept as one bitmask per cell, bit d-1 for digit d, with
+    precomputed unit, peer and box/line intersection indexes. After each
+    step the ladder starts over from the cheapest technique. techniques
+    limits the ladder to the named ones. Grids up to 16x16 are supported.
+    """
+
+    def __init__(self, box=(3, 3), techniques=None):
+        super().__init__()
+        box_rows, box_cols = box
+        self.box = box
+        self.size = n = box_rows * box_cols
+        if n > 16:
+            raise ValueError("the logic solver supports grids up to 16x16")
+        self.all = (1 << n) - 1
+        self.popcount = tuple(bin(m).count("1") for m in range(1 << n))
+        self.digits = tuple(tuple(d for d in range(n) if m >> d & 1) for m in range(1 << n))
+
+        self.rows = [tuple(r * n + c for c in range(n)) for r in range(n)]
+        self.cols = [tuple(r * n + c for r in range(n)) for c in range(n)]
+        self.boxes = [tuple((br + r) * n + bc + c for r in range(box_rows) for c in range(box_cols))
+                      for br in range(0, n, box_rows) for bc in range(0, n, box_cols)]
+        self.units = self.rows + self.cols + self.boxes
+        peers = [set() for _ in range(n * n)]
+        for unit in self.units:
+            for i in unit:
+                peers[i].update(unit)
+        for i, p in enumerate(peers):
+            p.discard(i)
+        self.peers = [frozenset(p) for p in peers]
+        # (intersection, rest of the box, rest of the line) for every box and line crossing it
+        self.intersections = []
+        for b in self.boxes:
+            for line in self.rows + self.cols:
+                inter = set(b) & set(line)
+                if inter:
+                    self.intersections.append((tuple(inter), tuple(set(b) - inter),
+                                               tuple(set(line) - inter)))
+
+        self.techniques = [(name, getattr(self, "_" + name.replace(" ", "_").replace("-", "_")))
+                           for name, _ in TECHNIQUES if techniques is None or name in techniques]
+
+    def solve(self, puzzle, stats=None):
+        """solve the puzzle by logic alone, None if it needs guessing"""
+        if stats is None:
+            result = self.run(puzzle)
+        else:
+            start = time.perf_counter()
+            result = self.run(puzzle)
+            stats.search_time += time.perf_counter() - start
+            for step in result.steps:
+                stats.visit(0)
+                stats.eliminations += len(step.eliminated)
+        return result.grid if result.solved else None
+
+    def run(self, puzzle):
+        """apply techniques until solved or stuck, returning a LogicResult"""
+        n = self.size
+        self.values = values = [v for row in puzzle for v in row]
+        self.cand = [self.all] * (n * n)
+        steps = []
+        ok = len(values) == n * n
+        for i, v in enumerate(values if ok else ()):
+            if v:
+                values[i] = 0
+                if not (0 < v <= n and self._place(i, v)):
+                    ok = False
+                    break
+        while ok and self._consistent():
+            if all(values):
+                return LogicResult(self._grid(), steps, True, False)
+            for _, technique in self.techniques:
+                step = technique()
+                if step:
+                    steps.append(step)
+                    break
+            else:
+                return LogicResult(self._grid(), steps, False, False)  # stuck, needs guessing
+        return LogicResult(self._grid(), steps, False, True)
+
+    def _grid(self):
+        n = self.size
+        return [self.values[i:i + n] for i in range(0, n * n, n)]
+
+    def _cell(self, i, d):
+        return divmod(i, self.size) + (d,)
+
+    def _place(self, i, d):
+        """place digit d in cell i, False if d is not a candidate there"""
+        bit = 1 << (d - 1)
+        cand = self.cand
+        if not cand[i] & bit:
+            return False
+        self.values[i] = d
+        cand[i] = 0
+        for p in self.peers[i]:
+            cand[p] &= ~bit
+        return True
+
+    def _eliminate(self, cells, mask):
+        """remove the digits of mask from cells, returning the (row, col, digit) removed"""
+        cand, digits = self.cand, self.digits
+        removed = []
+        for i in cells:
+            hit = cand[i] & mask
+            if hit:
+                cand[i] &= ~hit
+                removed.extend(self._cell(i, d + 1) for d in digits[hit])
+        return removed
+
+    def _consistent(self):
+        """whether every empty cell has a candidate and every digit a place in every unit"""
+        values, cand, full = self.values, self.cand, self.all
+        if any(not m and not v for m, v in zip(cand, values)):
+            return False
+        for unit in self.units:
+            seen = 0
+            for i in unit:
+                seen |= cand[i] | (1 << (values[i] - 1) if values[i] else 0)
+            if seen != full:
+                return False
+        return True
+
+    def _naked_single(self):
+        cand, popcount = self.cand, self.popcount
+        placed = []
+        for i in range(len(cand)):
+            m = cand[i]
+            if m and popcount[m] == 1:
+                d = m.bit_length()
+                self._place(i, d)
+                placed.append(self._cell(i, d))
+        return Step("naked single", placed) if placed else None
+
+    def _hidden_single(self):
+        cand = self.cand
+        placed = []
+        for unit in self.units:
+            once = twice = 0
+            for i in unit:
+                m = cand[i]
+                twice |= once & m
+                once |= m
+            hidden = once & ~twice
+            while hidden:
+                bit = hidden & -hidden
+                hidden ^= bit
+                for i in unit:
+                    if cand[i] & bit:
+                        self._place(i, bit.bit_length())
+                        placed.append(self._cell(i, bit.bit_length()))
+                        break
+        return Step("hidden single", placed) if placed else None
+
+    def _locked_candidates(self):
+        cand = self.cand
+        for inter, box_rest, line_rest in self.intersections:
+            m = 0
+            for i in inter:
+                m |= cand[i]
+            if not m:
+                continue
+            in_box = in_line = 0
+            for i in box_rest:
+                in_box |= cand[i]
+            for i in line_rest:
+                in_line |= cand[i]
+            # pointing: confined to the line within the box; claiming: to the box within the line
+            eliminated = (self._eliminate(line_rest, m & ~in_box)
+                          + self._eliminate(box_rest, m & ~in_line))
+            if eliminated:
+                return Step("locked candidates", (), eliminated)
+        return None
+
+    def _naked_subset(self, k, name):
+        """k cells of a unit holding only k digits between them"""
+        cand, popcount = self.cand, self.popcount
+        for unit in self.units:
+            cells = [i for i in unit if cand[i] and popcount[cand[i]] <= k]
+            for combo in itertools.combinations(cells, k):
+                m = 0
+                for i in combo:
+                    m |= cand[i]
+                if popcount[m] == k:
+                    eliminated = self._eliminate([i for i in unit if i not in combo], m)
+                    if eliminated:
+                        return Step(name, (), eliminated)
+        return None
+
+    def _hidden_subset(self, k, name):
+        """k digits of a unit confined to the same k cells"""
+        cand, popcount, digits = self.cand, self.popcount, self.digits
+        n = self.size
+        for unit in self.units:
+            where = [0] * n  # the unit positions of each digit
+            for j, i in enumerate(unit):
+                for d in digits[cand[i]]:
+                    where[d] |= 1 << j
+            candidates = [d for d in range(n) if where[d] and popcount[where[d]] <= k]
+            for combo in itertools.combinations(candidates, k):
+                positions = keep = 0
+                for d in combo:
+                    positions |= where[d]
+                    keep |= 1 << d
+                if popcount[positions] == k:
+                    cells = [unit[j] for j in digits[positions]]
+                    eliminated = self._eliminate(cells, self.all & ~keep)
+                    if eliminated:
+                        return Step(name, (), eliminated)
+        return None
+
+    def _fish(self, k, name):
+        """a digit confined to k columns within k rows, or the other way round"""
+        cand, popcount, digits = self.cand, self.popcount, self.digits
+        for d in range(self.size):
+            bit = 1 << d
+            for base_units, cover_units in ((self.rows, self.cols), (self.cols, self.rows)):
+                bases = []  # (base index, mask of the cover units holding the digit)
+                for b, unit in enumerate(base_units):
+                    p = 0
+                    for j, i in enumerate(unit):
+                        if cand[i] & bit:
+                            p |= 1 << j
+                    if p and popcount[p] <= k:
+                        bases.append((b, p))
+                for combo in itertools.combinations(bases, k):
+                    p = 0
+                    for _, q in combo:
+                        p |= q
+                    if popcount[p] == k:
+                        used = {b for b, _ in combo}
+                        cells = [i for j in digits[p] for b, i in enumerate(cover_units[j]) if b not in used]
+                        eliminated = self._eliminate(cells, bit)
+                        if eliminated:
+                            return Step(name, (), eliminated)
+        return None
+
+    def _naked_pair(self):
+        return self._naked_subset(2, "naked pair")
+
+    def _hidden_pair(self):
+        return self._hidden_subset(2, "hidden pair")
+
+    def _naked_triple(self):
+        return self._naked_subset(3, "naked triple")
+
+    def _hidden_triple(self):
+        return self._hidden_subset(3, "hidden triple")
+
+    def _x_wing(self):
+        return self._fish(2, "x-wing")
+
+    def _swordfish(self):
+        return self._fish(3, "swordfish")
+
+    def _xy_wing(self):
+        """pivot xy with pincers xz and yz: no cell seeing both pincers holds z"""
+        cand, popcount, peers = self.cand, self.popcount, self.peers
+        for pivot, m in enumerate(cand):
+            if popcount[m] != 2:
+                continue
+            wings = [p for p in peers[pivot] if popcount[cand[p]] == 2 and popcount[cand[p] & m] == 1]
+            for a, b in itertools.combinations(wings, 2):
+                ma, mb = cand[a], cand[b]
+                if ma & m == mb & m or ma & ~m != mb & ~m:
+                    continue
+                eliminated = self._eliminate(peers[a] & peers[b], ma & ~m)
+                if eliminated:
+                    return Step("xy-wing", (), eliminated)
+        return None
+
+    def _simple_coloring(self):
+        """two-color the chains of a digit's conjugate pairs
+
+        A color with two cells seeing each other is false everywhere, and a
+        cell seeing both colors cannot hold the digit.
+        """
+        cand, peers = self.cand, self.peers
+        for d in range(self.size):
+            bit = 1 << d
+            links = {}
+            for unit in self.units:
+                cells = [i for i in unit if cand[i] & bit]
+                if len(cells) == 2:
+                    a, b = cells
+                    links.setdefault(a, []).append(b)
+                    links.setdefault(b, []).append(a)
+            color = {}
+            for start in links:
+                if start in color:
+                    continue
+                sides = ([start], [])
+                color[start] = 0
+                queue = [start]
+                while queue:
+                    i = queue.pop()
+                    for p in links[i]:
+                        if p not in color:
+                            color[p] = 1 - color[i]
+                            sides[color[p]].append(p)
+                            queue.append(p)
+                for side in sides:
+                    if any(q in peers[p] for p, q in itertools.combinations(side, 2)):
+                        return Step("simple coloring", (), self._eliminate(side, bit))
+                seen = [set().union(*(peers[i] for i in side)) for side in sides]
+                eliminated = self._eliminate((seen[0] & seen[1]) - set(sides[0]) - set(sides[1]), bit)
+                if eliminated:
+                    return Step("simple coloring", (), eliminated)
+        return None
+
+
+_solvers = thread_local()  # LogicSolver per box shape and thread, built on first use
+
+
+def solve_logically(puzzle, box=None):
+    """run the calling thread's LogicSolver of the puzzle's box shape, returning a LogicResult
+
+    run keeps its working grid on the solver, so every thread gets its own
+    and this can be called from several threads at once.
+    """
+    box = box or box_shape(len(puzzle))
+    solvers = _solvers.__dict__
+    solver = solvers.get(box)
+    if solver is None:
+        solver = solvers[box] = LogicSolver(box)
+    return solver.run(puzzle)
+
+
+def grade_puzzle(puzzle, box=None):
+    """the grade of the hardest technique a puzzle needs, None if it needs guessing"""
+    return solve_logically(puzzle, box).grade
+
+
+def needs_guessing(puzzle, box=None):
+    """whether logic alone cannot solve the puzzle"""
+    return not solve_logically(puzzle, box).solved
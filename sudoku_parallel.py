@@ -0,0 +1,144 @@
+import multiprocessing
+
+from sudoku_dlx import SudokuDLX, box_shape, count_solutions, solve_sudoku
+
+MAX_SPLIT_DEPTH = 8  # branching levels expanded at most when splitting
+
+
+def split(grid, target, box=None):
+    """split a puzzle into subproblems whose solutions partition its own
+
+    Expands the top levels of the exact cover search breadth first, always on
+    the column with the fewest rows. Every row of that column places one
+    digit, and exactly one of them is in any solution, so the branches are
+    disjoint and cover every solution. Columns left with a single row are
+    filled in without counting as a level, and dead ends are dropped.
+    Expansion stops once there are target subproblems, nothing is left to
+    branch on or MAX_SPLIT_DEPTH levels have branched. Subproblems are
+    returned as copies of grid with the branch's digits filled in, [] if
+    the puzzle turns out to have no solution.
+    """
+    box = box or box_shape(len(grid))
+    n = box[0] * box[1]
+    solver = SudokuDLX(box)
+    R, D, siz, row = solver.R, solver.D, solver.siz, solver.row
+
+    def settle(prefix):
+        """(prefix and its forced rows, rows to branch on), None for a dead end
+
+        The rows to branch on are those of the column with the fewest rows,
+        [] once the prefix completes a solution.
+        """
+        for r in prefix:
+            solver.select(r)
+        prefix = list(prefix)
+        try:
+            while R[0]:
+                c = i = R[0]
+                while i:
+                    if siz[i] < siz[c]:
+                        c = i
+                    i = R[i]
+                if not siz[c]:
+                    return None
+                if siz[c] > 1:
+                    rows = []
+                    i = D[c]
+                    while i != c:
+                        rows.append(row[i])
+                        i = D[i]
+                    return prefix, rows
+                prefix.append(row[D[c]])
+                solver.select(prefix[-1])
+            return prefix, []
+        finally:
+            for _ in prefix:
+                solver.deselect()
+
+    try:
+        if not solver.apply(grid):
+            return []
+        root = settle([])
+        if root is None:
+            return []
+        frontier = [root]  # (row ids chosen below the givens, rows to branch on)
+        for _ in range(MAX_SPLIT_DEPTH):
+            if len(frontier) >= target or not any(rows for _, rows in frontier):
+                break
+            expanded = []
+            for prefix, rows in frontier:
+                if not rows:
+                    expanded.append((prefix, rows))  # already a complete solution
+                    continue
+                for r in rows:
+                    child = settle(prefix + [r])
+                    if child is not None:
+                        expanded.append(child)
+            frontier = expanded
+    finally:
+        solver.reset()
+
+    subproblems = []
+    for prefix, _ in frontier:
+        sub = [list(r) for r in grid]
+        for r in prefix:
+            cell, v = divmod(r - 1, n)
+            sub[cell // n][cell % n] = v + 1
+        subproblems.append(sub)
+    return subproblems
+
+
+def _count_task(task):
+    grid, limit, box = task
+    return count_solutions(grid, limit, box=box)
+
+
+def _solve_task(task):
+    grid, box = task
+    return solve_sudoku(grid, box=box)
+
+
+def _split_for(grid, workers, box):
+    """the box shape, worker count and subproblems for a parallel search"""
+    box = box or box_shape(len(grid))
+    workers = workers or multiprocessing.cpu_count()
+    return box, workers, split(grid, workers * 4, box)
+
+
+def count_parallel(grid, limit=2, workers=None, box=None):
+    """count the solutions of the sudoku across a pool of worker processes
+
+    The search tree is split into subproblems (see split) whose counts are
+    added up as they finish; once limit is reached the remaining ones are
+    cancelled with the pool. limit None counts every solution. workers
+    defaults to the CPU count. A puzzle split leaves whole, or solves, is
+    counted in the calling process.
+    """
+    box, workers, subproblems = _split_for(grid, workers, box)
+    if len(subproblems) < 2:
+        return sum(count_solutions(sub, limit, box=box) for sub in subproblems)
+    found = 0
+    with multiprocessing.Pool(workers) as pool:
+        tasks = [(sub, limit, box) for sub in subproblems]
+        for count in pool.imap_unordered(_count_task, tasks):
+            found += count
+            if limit is not None and found >= limit:
+                return limit
+    return found
+
+
+def solve_parallel(grid, workers=None, box=None):
+    """solve the sudoku across a pool of worker processes
+
+    Returns the first solution any subproblem yields, cancelling the rest, or
+    None if there is none. A puzzle split leaves whole, or solves, is solved
+    in the calling process.
+    """
+    box, workers, subproblems = _split_for(grid, workers, box)
+    if len(subproblems) < 2:
+        return solve_sudoku(subproblems[0], box=box) if subproblems else None
+    with multiprocessing.Pool(workers) as pool:
+        for solution in pool.imap_unordered(_solve_task, [(sub, box) for sub in subproblems]):
+            if solution is not None:
+                return solution
+    return None
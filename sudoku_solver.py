@@ -1,25 +1,45 @@
-import copy
-import re
-from typing import Dict, List, Optional, Tuple
+from __future__ import annotations
+
+import time
+
+from sudoku_dlx import SudokuDLX
+from sudoku_grid import Grid as PackedGrid
+
+# typing and the stats module are only imported by type checkers, annotations
+# are never evaluated at runtime
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import List, Optional, Tuple
+
+    from sudoku_stats import SolverStats
 
 
 class Solver:
     def __init__(self):
         pass
 
-    def solve(self):
+    def solve(self, puzzle: List[List[int]], stats: Optional[SolverStats] = None):
+        """solve the puzzle, a list of row lists or a sudoku_grid.Grid
+
+        stats is an optional SolverStats to fill in.
+        """
         raise NotImplementedError
 
 
 class BacktrackingSolver(Solver):
-    def solve(self, puzzle: List[List[int]]):
-        puzzle = copy.deepcopy(puzzle)
-        if self._solve(puzzle):
-            return puzzle
-        else:
-            return None
-
-    def _solve(self, puzzle: List[List[int]]):
+    def solve(self, puzzle: List[List[int]], stats: Optional[SolverStats] = None):
+        if stats is None:
+            puzzle = [list(row) for row in puzzle]
+            return puzzle if self._solve(puzzle) else None
+        start = time.perf_counter()
+        puzzle = [list(row) for row in puzzle]
+        now = time.perf_counter()
+        stats.build_time += now - start
+        solved = self._solve(puzzle, stats)
+        stats.search_time += time.perf_counter() - now
+        return puzzle if solved else None
+
+    def _solve(self, puzzle: List[List[int]], stats: Optional[SolverStats] = None, depth: int = 0):
         empty_cell = self._find_empty_cell(puzzle)
         if empty_cell is None:
             return True
@@ -28,11 +48,15 @@ class BacktrackingSolver(Solver):
 
         for num in range(1, 10):
             if self._is_valid(puzzle, row, col, num):
+                if stats is not None:
+                    stats.visit(depth)
                 puzzle[row][col] = num
-                if self._solve(puzzle):
+                if self._solve(puzzle, stats, depth + 1):
                     return True
                 puzzle[row][col] = 0
 
+        if stats is not None:
+            stats.backtracks += 1
         return False
 
     # def _find_empty_cell(self, puzzle: List[List[int]]):
@@ -80,32 +104,59 @@ class BacktrackingSolver(Solver):
         return True
 
 
-def cross(A, B):
-    "Cross product of strings in A and strings in B."
-    return tuple(a + b for a in A for b in B)
-
-
 Digit     = str  # e.g. '1'
 digits    = '123456789'
 DigitSet  = str  # e.g. '123'
-rows      = 'ABCDEFGHI'
-cols      = digits
-Square    = str  # e.g. 'A9'
-squares   = cross(rows, cols)
-Grid      = Dict[Square, DigitSet] # E.g. {'A9': '123', ...}
-all_boxes = [cross(rs, cs)  for rs in ('ABC','DEF','GHI') for cs in ('123','456','789')]
-all_units = [cross(rows, c) for c in cols] + [cross(r, cols) for r in rows] + all_boxes
-units     = {s: tuple(u for u in all_units if s in u) for s in squares}
-peers     = {s: set().union(*units[s]) - {s} for s in squares}
-Picture   = str 
+Square    = int  # e.g. 80, squares are numbered 0-80 row by row
+Picture   = str
+if TYPE_CHECKING:
+    Grid  = List[DigitSet]  # the candidates of every square, e.g. ['123', ...]
+
+_cp_tables = None  # built on first use by cp_tables
+
+
+def cp_tables():
+    """(all_units, units, peers) of the constraint propagation solver, built once
+
+    all_units lists the squares of every row, column and box, units[s] the
+    three units of square s and peers[s] the 20 other squares in them.
+    """
+    global _cp_tables
+    if _cp_tables is None:
+        all_units = ([tuple(range(r * 9, r * 9 + 9)) for r in range(9)]
+                     + [tuple(range(c, 81, 9)) for c in range(9)]
+                     + [tuple(r * 9 + c for r in range(br, br + 3) for c in range(bc, bc + 3))
+                        for br in (0, 3, 6) for bc in (0, 3, 6)])
+        units = [[] for _ in range(81)]
+        for u in all_units:
+            for s in u:
+                units[s].append(u)
+        units = tuple(tuple(u) for u in units)
+        peers = tuple(tuple(sorted(set().union(*units[s]) - {s})) for s in range(81))
+        _cp_tables = (tuple(all_units), units, peers)
+    return _cp_tables
 
 
 class ConstraintPropagationSolver(Solver):
-    def solve(self, puzzle: List[List[int]]):
-        puzzle = copy.deepcopy(puzzle)
-        picture = ''.join(str(num) for row in puzzle for num in row).replace('0', '.')
+    def __init__(self):
+        super().__init__()
+        self.all_units, self.units, self.peers = cp_tables()
+
+    def solve(self, puzzle: List[List[int]], stats: Optional[SolverStats] = None):
+        if stats is not None:
+            start = time.perf_counter()
+        if isinstance(puzzle, PackedGrid):
+            picture = puzzle.to_string()
+        else:
+            picture = ''.join(str(num) for row in puzzle for num in row).replace('0', '.')
         grid = self._parse(picture)
-        solution = self._search(grid)
+        if stats is None:
+            solution = self._search(grid)
+        else:
+            now = time.perf_counter()
+            stats.build_time += now - start
+            solution = self._search(grid, stats)
+            stats.search_time += time.perf_counter() - now
         if solution is not None and self._is_solution(solution, grid):
             return self._grid_to_array(solution)
         else:
@@ -113,21 +164,20 @@ class ConstraintPropagationSolver(Solver):
 
     def _parse(self, picture: str) -> Grid:
         """Convert a Picture to a Grid."""
-        vals = re.findall(r"[.1-9]|[{][1-9]+[}]", picture)
+        vals = [v for v in picture if v in digits or v == '.']
         assert len(vals) == 81
-        return {s: digits if v == '.' else re.sub(r"[{}]", '', v) 
-                for s, v in zip(squares, vals)}
+        return [digits if v == '.' else v for v in vals]
     
     def _is_solution(self, solution: Optional[Grid], puzzle: Grid) -> bool:
         "Is this proposed solution to the puzzle actually valid?"
         return (solution is not None and
-                all(solution[s] in puzzle[s] for s in squares) and
-                all({solution[s] for s in unit} == set(digits) for unit in all_units))
+                all(solution[s] in puzzle[s] for s in range(81)) and
+                all({solution[s] for s in unit} == set(digits) for unit in self.all_units))
 
     def _constrain(self, grid: Grid) -> Grid:
         "Propagate constraints on a copy of grid to yield a new constrained Grid."
-        result: Grid = {s: digits for s in squares}
-        for s in grid:
+        result: Grid = [digits] * 81
+        for s in range(81):
             if len(grid[s]) == 1:
                 self._fill(result, s,  grid[s])
         return result
@@ -149,198 +199,205 @@ class ConstraintPropagationSolver(Solver):
         elif len(grid[s]) == 1:
             # 1. If a square has only one possible digit, then eliminate that digit as a possibility for each of the square's peers.
             d2 = grid[s]
-            if not all(self._eliminate(grid, s2, d2) for s2 in peers[s]):
+            if not all(self._eliminate(grid, s2, d2) for s2 in self.peers[s]):
                 return None    ## None: can't eliminate d2 from some square
-        for u in units[s]:
+        for u in self.units[s]:
             dplaces = [s for s in u if d in grid[s]]
             # 2. If a unit has only one possible square that can hold a digit, then fill the square with the digit.
             if not dplaces or (len(dplaces) == 1 and not self._fill(grid, dplaces[0], d)):
                 return None    ## None: no place in u for d
         return grid
     
-    def _search(self, grid: Optional[Grid]) -> Optional[Grid]:
+    def _search(self, grid: Optional[Grid], stats: Optional[SolverStats] = None,
+                depth: int = 0) -> Optional[Grid]:
         "Depth-first search with constraint propagation to find a solution."
         if grid is None: 
             return None
-        s = min((s for s in squares if len(grid[s]) > 1), 
+        s = min((s for s in range(81) if len(grid[s]) > 1),
                 default=None, key=lambda s: len(grid[s]))
         if s is None: # No squares with multiple possibilities; the search has succeeded
             return grid
         for d in grid[s]:
-            solution = self._search(self._fill(grid.copy(), s, d))
+            if stats is None:
+                solution = self._search(self._fill(grid.copy(), s, d))
+            else:
+                stats.visit(depth)
+                filled = self._fill(grid.copy(), s, d)
+                if filled is None:
+                    stats.backtracks += 1
+                else:
+                    stats.eliminations += sum(map(len, grid)) - sum(map(len, filled))
+                solution = self._search(filled, stats, depth + 1)
             if solution:
                 return solution
         return None
 
     def _grid_to_array(self, grid: Grid) -> List[List[int]]:
-        """Convert a grid dictionary to 2D array format."""
-        result = []
-        for row in rows:
-            current_row = []
-            for col in cols:
-                current_row.append(int(grid[row + col]))
-            result.append(current_row)
-        return result
+        """Convert a grid to 2D array format."""
+        return [[int(grid[r * 9 + c]) for c in range(9)] for r in range(9)]
+
 
+ALL_DIGITS = 0x1FF  # one bit per digit, bit d-1 for digit d
+_bitmask_tables = None  # built on first use by bitmask_tables
+
+
+def bitmask_tables():
+    """(cell_rows, cell_cols, cell_boxes, cell_units, popcount) of the bitmask solver, built once"""
+    global _bitmask_tables
+    if _bitmask_tables is None:
+        cell_rows = tuple(i // 9 for i in range(81))
+        cell_cols = tuple(i % 9 for i in range(81))
+        cell_boxes = tuple(i // 27 * 3 + i % 9 // 3 for i in range(81))
+        cell_units = tuple(tuple(i for i in range(81) if key[i] == u)
+                           for key in (cell_rows, cell_cols, cell_boxes) for u in range(9))
+        popcount = tuple(bin(m).count('1') for m in range(512))
+        _bitmask_tables = (cell_rows, cell_cols, cell_boxes, cell_units, popcount)
+    return _bitmask_tables
+
+
+class BitmaskSolver(Solver):
+    """Backtracking over 9-bit digit masks with naked and hidden singles.
+
+    Row, column and box masks hold the digits already placed, the candidates
+    of a cell are whatever none of its three masks hold. Placements are undone
+    from a trail on backtrack, so nothing is copied while searching.
+    """
 
-class DancingLinksSolver(Solver):
     def __init__(self):
         super().__init__()
-        self.MAXSIZE = 100010
-        self.n = 0  # number of rows
-        self.m = 0  # number of columns
-        self.tot = 0  # number of nodes
-        self.first = [0] * (self.MAXSIZE + 10)  # the first node in each row
-        self.siz = [0] * (self.MAXSIZE + 10)  # the number of nodes in each column
-        self.L = [0] * (self.MAXSIZE + 10)  # left pointer
-        self.R = [0] * (self.MAXSIZE + 10)  # right pointer
-        self.U = [0] * (self.MAXSIZE + 10)  # up pointer
-        self.D = [0] * (self.MAXSIZE + 10)  # down pointer
-        self.col = [0] * (self.MAXSIZE + 10)  # the column of the node
-        self.row = [0] * (self.MAXSIZE + 10)  # the row of the node
-
-    def build(self, r: int, c: int):
-        """initialize DLX"""
-        self.n = r
-        self.m = c
-        for i in range(c + 1):
-            self.L[i] = i - 1
-            self.R[i] = i + 1
-            self.U[i] = self.D[i] = i
-        self.L[0] = c
-        self.R[c] = 0
-        self.tot = c
-        self.first = [0] * (self.MAXSIZE + 10)
-        self.siz = [0] * (self.MAXSIZE + 10)
-
-    def insert(self, r: int, c: int):
-        """insert a node"""
-        self.tot += 1
-        self.col[self.tot] = c
-        self.row[self.tot] = r
-        self.siz[c] += 1
-        
-        self.D[self.tot] = self.D[c]
-        self.U[self.D[c]] = self.tot
-        self.U[self.tot] = c
-        self.D[c] = self.tot
-        
-        if not self.first[r]:
-            self.first[r] = self.L[self.tot] = self.R[self.tot] = self.tot
+        self.tables = bitmask_tables()
+
+    def solve(self, puzzle: List[List[int]],
+              stats: Optional[SolverStats] = None) -> Optional[List[List[int]]]:
+        if stats is not None:
+            start = time.perf_counter()
+        cell_rows, cell_cols, cell_boxes = self.tables[:3]
+        if isinstance(puzzle, PackedGrid):
+            grid = list(puzzle.cells)
         else:
-            self.R[self.tot] = self.R[self.first[r]]
-            self.L[self.R[self.first[r]]] = self.tot
-            self.L[self.tot] = self.first[r]
-            self.R[self.first[r]] = self.tot
-
-    def remove(self, c: int):
-        """remove the column c and its related rows"""
-        self.L[self.R[c]] = self.L[c]
-        self.R[self.L[c]] = self.R[c]
-        i = self.D[c]
-        while i != c:
-            j = self.R[i]
-            while j != i:
-                self.U[self.D[j]] = self.U[j]
-                self.D[self.U[j]] = self.D[j]
-                self.siz[self.col[j]] -= 1
-                j = self.R[j]
-            i = self.D[i]
-
-    def recover(self, c: int):
-        """recover the column c and its related rows"""
-        i = self.U[c]
-        while i != c:
-            j = self.L[i]
-            while j != i:
-                self.U[self.D[j]] = self.D[self.U[j]] = j
-                self.siz[self.col[j]] += 1
-                j = self.L[j]
-            i = self.U[i]
-        self.L[self.R[c]] = self.R[self.L[c]] = c
-
-    def dance(self, dep: int, stk: List[int], ans: List[List[int]]) -> bool:
-        """Dancing Links algorithm main process"""
-        if not self.R[0]:
-            for i in range(1, dep):
-                x = (stk[i] - 1) // 9 // 9
-                y = (stk[i] - 1) // 9 % 9
-                v = (stk[i] - 1) % 9 + 1
-                ans[x][y] = v
+            grid = [v for row in puzzle for v in row]
+        row_mask, col_mask, box_mask = [0] * 9, [0] * 9, [0] * 9
+        for i, v in enumerate(grid):
+            if v:
+                bit = 1 << (v - 1)
+                r, c, b = cell_rows[i], cell_cols[i], cell_boxes[i]
+                if (row_mask[r] | col_mask[c] | box_mask[b]) & bit:
+                    return None
+                row_mask[r] |= bit
+                col_mask[c] |= bit
+                box_mask[b] |= bit
+        if stats is None:
+            solved = self._search(grid, row_mask, col_mask, box_mask)
+        else:
+            now = time.perf_counter()
+            stats.build_time += now - start
+            solved = self._search(grid, row_mask, col_mask, box_mask, stats)
+            stats.search_time += time.perf_counter() - now
+        if solved:
+            return [grid[i:i + 9] for i in range(0, 81, 9)]
+        return None
+
+    def _search(self, grid: List[int], row_mask: List[int], col_mask: List[int],
+                box_mask: List[int], stats: Optional[SolverStats] = None,
+                depth: int = 0) -> bool:
+        """Fill singles until stuck, then branch on the cell with fewest candidates."""
+        cell_rows, cell_cols, cell_boxes, cell_units, popcount = self.tables
+        trail = []  # cells filled at this level, undone on failure
+
+        def place(i: int, bit: int) -> bool:
+            r, c, b = cell_rows[i], cell_cols[i], cell_boxes[i]
+            if (row_mask[r] | col_mask[c] | box_mask[b]) & bit:
+                return False
+            row_mask[r] |= bit
+            col_mask[c] |= bit
+            box_mask[b] |= bit
+            grid[i] = bit.bit_length()
+            trail.append(i)
             return True
 
-        c = self.R[0]
-        i = self.R[0]
-        while i != 0:
-            if self.siz[i] < self.siz[c]:
-                c = i
-            i = self.R[i]
-
-        self.remove(c)
-        i = self.D[c]
-        while i != c:
-            stk[dep] = self.row[i]
-            j = self.R[i]
-            while j != i:
-                self.remove(self.col[j])
-                j = self.R[j]
-            if self.dance(dep + 1, stk, ans):
-                return True
-            j = self.L[i]
-            while j != i:
-                self.recover(self.col[j])
-                j = self.L[j]
-            i = self.D[i]
-        self.recover(c)
-        return False
+        def unplace(i: int):
+            bit = ~(1 << (grid[i] - 1))
+            row_mask[cell_rows[i]] &= bit
+            col_mask[cell_cols[i]] &= bit
+            box_mask[cell_boxes[i]] &= bit
+            grid[i] = 0
+
+        def fail() -> bool:
+            if stats is not None:
+                stats.backtracks += 1
+            while trail:
+                unplace(trail.pop())
+            return False
+
+        cand = [0] * 81
+        while True:
+            # 1. naked singles, and the minimum-remaining-values cell
+            progress = False
+            best, best_count = -1, 10
+            for i in range(81):
+                if grid[i]:
+                    continue
+                m = ALL_DIGITS & ~(row_mask[cell_rows[i]] | col_mask[cell_cols[i]]
+                                   | box_mask[cell_boxes[i]])
+                n = popcount[m]
+                if n == 0:
+                    return fail()
+                if n == 1:
+                    place(i, m)
+                    progress = True
+                    continue
+                cand[i] = m
+                if n < best_count:
+                    best, best_count = i, n
+            if progress:
+                continue
+            if best < 0:
+                return True  # no empty cells left
+            # 2. hidden singles: a digit with a single place in some unit
+            for unit in cell_units:
+                once = twice = placed = 0
+                for i in unit:
+                    if grid[i]:
+                        placed |= 1 << (grid[i] - 1)
+                    else:
+                        m = cand[i]
+                        twice |= once & m
+                        once |= m
+                if (once | placed) != ALL_DIGITS:
+                    return fail()
+                hidden = once & ~twice & ~placed
+                if hidden:
+                    for i in unit:
+                        bit = cand[i] & hidden
+                        if bit and not grid[i]:
+                            if popcount[bit] > 1 or not place(i, bit):
+                                return fail()
+                            progress = True
+            if progress:
+                continue
+            # 3. branch on the cell with the fewest candidates
+            m = cand[best]
+            while m:
+                bit = m & -m
+                m ^= bit
+                if stats is not None:
+                    stats.visit(depth)
+                place(best, bit)
+                if self._search(grid, row_mask, col_mask, box_mask, stats, depth + 1):
+                    return True
+                unplace(trail.pop())
+            return fail()
+
 
-    def _get_id(self, row: int, col: int, num: int) -> int:
-        """get the id of the node"""
-        return (row - 1) * 9 * 9 + (col - 1) * 9 + num
-
-    def _insert_constraints(self, row: int, col: int, num: int):
-        """insert the constraints of the sudoku"""
-        dx = (row - 1) // 3 + 1
-        dy = (col - 1) // 3 + 1
-        room = (dx - 1) * 3 + dy
-        id = self._get_id(row, col, num)
-        
-        # four constraints
-        f1 = (row - 1) * 9 + num  # row constraint
-        f2 = 81 + (col - 1) * 9 + num  # column constraint
-        f3 = 81 * 2 + (room - 1) * 9 + num  # box constraint
-        f4 = 81 * 3 + (row - 1) * 9 + col  # cell constraint
-        
-        self.insert(id, f1)
-        self.insert(id, f2)
-        self.insert(id, f3)
-        self.insert(id, f4)
-
-    def solve(self, puzzle: List[List[int]]) -> Optional[List[List[int]]]:
+class DancingLinksSolver(Solver, SudokuDLX):
+    def __init__(self, box: Tuple[int, int] = (3, 3)):
+        Solver.__init__(self)
+        SudokuDLX.__init__(self, box)
+
+    def solve(self, puzzle: List[List[int]],
+              stats: Optional[SolverStats] = None) -> Optional[List[List[int]]]:
         """solve the sudoku using Dancing Links algorithm"""
-        # Initialize DLX
-        self.build(729, 324)  # 729 possible positions, 324 constraints
-        
-        # Build the constraint matrix
-        for i in range(1, 10):
-            for j in range(1, 10):
-                for v in range(1, 10):
-                    if puzzle[i-1][j-1] and puzzle[i-1][j-1] != v:
-                        continue
-                    self._insert_constraints(i, j, v)
-        
-        # Solve
-        stk = [0] * 1000  # stack
-        ans = [[0] * 9 for _ in range(9)]  # answer array
-        
-        # Copy the original sudoku to the answer array
-        for i in range(9):
-            for j in range(9):
-                ans[i][j] = puzzle[i][j]
-        
-        if self.dance(1, stk, ans):
-            return ans
-        return None
+        return SudokuDLX.solve(self, puzzle, stats)
 
 
 if __name__ == "__main__":
@@ -356,7 +413,6 @@ if __name__ == "__main__":
         [0, 0, 8, 5, 0, 0, 0, 1, 0],
         [0, 9, 0, 0, 0, 0, 4, 0, 0]
     ]
-    import time
     start_time = time.time()
     solved = solver.solve(puzzle)
     end_time = time.time()
@@ -0,0 +1,53 @@
+class SolverStats:
+    """What a solver did on one or more runs.
+
+    Pass an instance as the stats argument of an engine to have it filled in,
+    engines given None skip every counter. Counts accumulate over runs:
+
+    - nodes: search tree nodes visited (rows tried by DLX, digits tried by the
+      other engines)
+    - backtracks: dead ends hit
+    - max_depth: deepest search level reached
+    - depth_histogram: nodes visited at each depth, indexed by depth
+    - eliminations: candidates removed by constraint propagation
+    - build_time / search_time: seconds spent setting up (matrix or candidate
+      build, givens) and searching
+    """
+
+    __slots__ = ("nodes", "backtracks", "max_depth", "depth_histogram",
+                 "eliminations", "build_time", "search_time")
+
+    def __init__(self):
+        self.nodes = 0
+        self.backtracks = 0
+        self.max_depth = 0
+        self.depth_histogram = []
+        self.eliminations = 0
+        self.build_time = 0.0
+        self.search_time = 0.0
+
+    def visit(self, depth):
+        """count a node visited at depth"""
+        self.nodes += 1
+        hist = self.depth_histogram
+        while len(hist) <= depth:
+            hist.append(0)
+        hist[depth] += 1
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    @property
+    def total_time(self):
+        return self.build_time + self.search_time
+
+    def as_dict(self):
+        """the stats as a JSON-serializable dict"""
+        result = {name: getattr(self, name) for name in self.__slots__}
+        result["depth_histogram"] = list(self.depth_histogram)
+        return result
+
+    def __repr__(self):
+        return "SolverStats(nodes=%d, backtracks=%d, max_depth=%d, eliminations=%d, build=%.6fs, search=%.6fs)" % (
+            self.nodes, self.backtracks, self.max_depth, self.eliminations,
+            self.build_time, self.search_time)
+
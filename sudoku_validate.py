@@ -0,0 +1,282 @@
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, the pure-Python path is used without it
+    np = None
+
+from sudoku_dlx import box_shape, solve_sudoku
+from sudoku_grid import Grid
+
+
+class BatchCheck:
+    """Per-grid results of check_batch, indexed like the input batch.
+
+    - valid: no digit repeats within a row, column or box, and every value
+      is in 0..n
+    - complete: no empty cells
+    - conflicts: per cell, whether it holds a repeated or out-of-range value
+    - candidates: per cell, the digits it can still take as a bitmask with
+      bit d-1 for digit d, 0 for filled cells
+
+    The fields are numpy arrays of shape (N,), (N,), (N, n, n) and (N, n, n)
+    when computed with numpy, nested lists otherwise.
+    """
+
+    __slots__ = ("valid", "complete", "conflicts", "candidates")
+
+    def __init__(self, valid, complete, conflicts, candidates):
+        self.valid = valid
+        self.complete = complete
+        self.conflicts = conflicts
+        self.candidates = candidates
+
+    def __len__(self):
+        return len(self.valid)
+
+    def __repr__(self):
+        return "BatchCheck(%d grids, %d valid, %d complete)" % (
+            len(self), sum(bool(v) for v in self.valid), sum(bool(c) for c in self.complete))
+
+
+def _use_numpy(use_numpy):
+    """resolve the use_numpy argument, None picks numpy when it is installed"""
+    if use_numpy is None:
+        return np is not None
+    if use_numpy and np is None:
+        raise ImportError("numpy is not installed")
+    return use_numpy
+
+
+def check_batch(grids, box=None, use_numpy=None):
+    """validate a batch of grids and compute their candidates
+
+    grids is an (N, n, n) uint8 array or a sequence of n x n grids, box the
+    (rows, cols) box shape, by default the squarest one fitting n. The
+    numpy path reduces every row, column and box of the whole batch at once,
+    use_numpy=False forces the pure-Python path. Returns a BatchCheck.
+    """
+    if not len(grids):
+        return BatchCheck([], [], [], [])
+    n = len(grids[0])
+    box = box or box_shape(n)
+    if _use_numpy(use_numpy):
+        return _np_check(_as_array(grids, n), box)
+    results = [_py_check(_as_list(grid), box) for grid in grids]
+    return BatchCheck(*(list(field) for field in zip(*results)))
+
+
+def eliminate_singles(grids, box=None, use_numpy=None):
+    """fill the naked and hidden singles of a batch of grids until none are left
+
+    Returns (filled, check), filled in the same form check_batch computed
+    with (an array or lists), and check the BatchCheck of the filled grids.
+    Grids that turn out invalid are left as they were when the conflict
+    appeared.
+    """
+    if not len(grids):
+        return [], BatchCheck([], [], [], [])
+    n = len(grids[0])
+    box = box or box_shape(n)
+    if _use_numpy(use_numpy):
+        return _np_singles(_as_array(grids, n), box)
+    filled = []
+    results = []
+    for grid in grids:
+        grid, result = _py_singles(_as_list(grid), box)
+        filled.append(grid)
+        results.append(result)
+    return filled, BatchCheck(*(list(field) for field in zip(*results)))
+
+
+def solve_batch(grids, solve=None, box=None, use_numpy=None):
+    """solve a batch of grids, singles are eliminated for the whole batch first
+
+    Only the grids still incomplete afterwards reach solve, which takes and
+    returns an n x n list grid and defaults to solve_sudoku. Returns a list
+    with a solution, or None, per grid.
+    """
+    if not len(grids):
+        return []
+    box = box or box_shape(len(grids[0]))
+    if solve is None:
+        solve = lambda grid: solve_sudoku(grid, box=box)
+    filled, check = eliminate_singles(grids, box, use_numpy)
+    solutions = []
+    for grid, valid, complete in zip(filled, check.valid, check.complete):
+        grid = _as_list(grid)
+        if not valid:
+            solutions.append(None)
+        elif complete:
+            solutions.append(grid)
+        else:
+            solutions.append(solve(grid))
+    return solutions
+
+
+def _as_array(grids, n):
+    """a batch of grids as an (N, n, n) uint8 array"""
+    if isinstance(grids[0], Grid):
+        # the packed cells already are the array's memory layout
+        data = b"".join(grid.cells for grid in grids)
+        return np.frombuffer(data, dtype=np.uint8).reshape(-1, n, n)
+    return np.asarray(grids, dtype=np.uint8).reshape(-1, n, n)
+
+
+def _as_list(grid):
+    """a grid as a list of row lists"""
+    if np is not None and isinstance(grid, np.ndarray):
+        return grid.tolist()
+    return [list(row) for row in grid]
+
+
+_units = {}  # (rows, cols, boxes) cell lists per box shape
+
+
+def units(box=(3, 3)):
+    """the cells of every row, column and box of a box shape, computed once"""
+    result = _units.get(box)
+    if result is None:
+        box_rows, box_cols = box
+        n = box_rows * box_cols
+        rows = [[(r, c) for c in range(n)] for r in range(n)]
+        cols = [[(r, c) for r in range(n)] for c in range(n)]
+        boxes = [[(r, c) for r in range(br, br + box_rows) for c in range(bc, bc + box_cols)]
+                 for br in range(0, n, box_rows) for bc in range(0, n, box_cols)]
+        result = _units[box] = rows + cols + boxes
+    return result
+
+
+def _py_check(grid, box):
+    """check one list grid, returning the BatchCheck fields"""
+    box_rows, box_cols = box
+    n = box_rows * box_cols
+    full = (1 << n) - 1
+    conflicts = [[not 0 <= v <= n for v in row] for row in grid]
+    masks = []  # digits placed in each unit, in the order of units()
+    for unit in units(box):
+        mask = 0
+        for r, c in unit:
+            v = grid[r][c]
+            if not 0 < v <= n:
+                continue
+            bit = 1 << (v - 1)
+            if mask & bit:
+                for r2, c2 in unit:
+                    if grid[r2][c2] == v:
+                        conflicts[r2][c2] = True
+            mask |= bit
+        masks.append(mask)
+    candidates = [[0] * n for _ in range(n)]
+    complete = True
+    for r in range(n):
+        for c in range(n):
+            if not grid[r][c]:
+                complete = False
+                b = r // box_rows * (n // box_cols) + c // box_cols
+                candidates[r][c] = full & ~(masks[r] | masks[n + c] | masks[2 * n + b])
+    valid = not any(any(row) for row in conflicts)
+    return valid, complete, conflicts, candidates
+
+
+def _py_singles(grid, box):
+    """fill the singles of one list grid, returning it and its BatchCheck fields"""
+    n = len(grid)
+    while True:
+        result = _py_check(grid, box)
+        valid, complete, _, candidates = result
+        if not valid or complete:
+            return grid, result
+        placed = False
+        # naked singles, cells with one candidate left
+        for r in range(n):
+            for c in range(n):
+                m = candidates[r][c]
+                if m and not m & (m - 1):
+                    grid[r][c] = m.bit_length()
+                    placed = True
+        # hidden singles, digits with one place left in a unit
+        if not placed:
+            for unit in units(box):
+                once = twice = 0
+                for r, c in unit:
+                    m = candidates[r][c]
+                    twice |= once & m
+                    once |= m
+                hidden = once & ~twice
+                for r, c in unit:
+                    bit = candidates[r][c] & hidden
+                    if bit and not grid[r][c]:
+                        grid[r][c] = bit.bit_length()
+                        placed = True
+        if not placed:
+            return grid, result
+
+
+def _np_units(cells, box):
+    """the (N, n, n) cells grouped into units, the rows, columns and boxes
+
+    Rows and columns come as (N, n, n) arrays and boxes as an
+    (N, n/rows, n/cols, n) array, each with the cells of a unit along the
+    last axis.
+    """
+    box_rows, box_cols = box
+    n = box_rows * box_cols
+    boxes = cells.reshape(-1, n // box_rows, box_rows, n // box_cols, box_cols)
+    boxes = boxes.transpose(0, 1, 3, 2, 4).reshape(-1, n // box_rows, n // box_cols, n)
+    return cells, cells.transpose(0, 2, 1), boxes
+
+
+def _np_fold(unit_masks):
+    """the bits set in any (once) and in at least two (twice) masks of each unit"""
+    once = np.zeros(unit_masks.shape[:-1], dtype=np.uint32)
+    twice = np.zeros_like(once)
+    for k in range(unit_masks.shape[-1]):
+        m = unit_masks[..., k]
+        twice |= once & m
+        once |= m
+    return once, twice
+
+
+def _np_spread(rows, cols, boxes, box):
+    """or per-row, per-column and per-box masks together for every cell"""
+    return (rows[:, :, None] | cols[:, None, :]
+            | boxes.repeat(box[0], axis=1).repeat(box[1], axis=2))
+
+
+def _np_check(grids, box):
+    """check an (N, n, n) uint8 array of grids, returning a BatchCheck of arrays"""
+    n = grids.shape[1]
+    in_range = grids <= n
+    empty = grids == 0
+    # bit d-1 for digit d, 0 for empty cells and values out of range
+    table = np.zeros(256, dtype=np.uint32)
+    table[1:n + 1] = [1 << k for k in range(n)]
+    bits = table[grids]
+    folds = [_np_fold(unit) for unit in _np_units(bits, box)]
+    used = _np_spread(*(once for once, _ in folds), box)
+    repeated = _np_spread(*(twice for _, twice in folds), box)
+    candidates = np.where(empty, np.uint32((1 << n) - 1) & ~used, np.uint32(0))
+    conflicts = ~in_range | (bits & repeated != 0)
+    valid = ~conflicts.any(axis=(1, 2))
+    complete = ~empty.any(axis=(1, 2))
+    return BatchCheck(valid, complete, conflicts, candidates)
+
+
+def _np_singles(grids, box):
+    """fill the singles of an (N, n, n) uint8 array, returning a copy and its BatchCheck"""
+    grids = grids.copy()
+    while True:
+        check = _np_check(grids, box)
+        # only grids that are valid and incomplete can make progress
+        active = (check.valid & ~check.complete)[:, None, None]
+        cand = np.where(active, check.candidates, np.uint32(0))
+        # naked singles, cells with one candidate left, and hidden singles,
+        # digits with one place left in one of the units of a cell
+        folds = [_np_fold(unit) for unit in _np_units(cand, box)]
+        hidden = cand & _np_spread(*(once & ~twice for once, twice in folds), box)
+        naked = (cand & (cand - np.uint32(1))) == 0
+        pick = np.where(naked, cand, hidden)
+        pick &= ~pick + np.uint32(1)  # lowest bit, when a cell has several hidden singles
+        placed = pick != 0
+        if not placed.any():
+            return grids, check
+        grids[placed] = np.log2(pick[placed]).astype(np.uint8) + 1